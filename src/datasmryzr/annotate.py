@@ -17,22 +17,21 @@ def _open_file(file_path:str) -> pd.DataFrame:
     Returns:
         str: File contents.
     """
-    df = pd.read_csv(file_path, sep = None, engine = 'python')
+    df = utils.read_table(file_path)
     return df
     
 
 def _check_vals(df:pd.DataFrame, 
                 cols:list,
-                cfg:dict) -> list:
+                cfg:utils.Config) -> list:
     """
     Validates and filters the specified columns from a DataFrame based on 
     their data type and configuration settings.
     Args:
         df (pd.DataFrame): The input DataFrame to check.
         cols (list): A list of column names to validate.
-        cfg (dict): A configuration dictionary containing the key 
-            'categorical_columns', which specifies columns to treat as 
-            categorical.
+        cfg (Config): The report configuration, with the 
+            'categorical_columns' to treat as categorical.
     Returns:
         list: A list of valid column names that are either non-numerical or 
         explicitly specified as categorical in the configuration.
@@ -43,21 +42,17 @@ def _check_vals(df:pd.DataFrame,
                 
     final_cols = []
     _id_col = df.columns[0]
-    indf = False
-    for col in cols:
-        if col in df.columns:
-            indf = True
-            is_string = True
-            if col != _id_col:
-                
-                for val in df[col].unique():
-                    if isinstance(val, str):   
-                        is_string = True
-                    else: 
-                        is_string = False
-                    
-                if is_string or col in cfg['categorical_columns']:
-                    final_cols.append(col)
+    indf = any(col in df.columns for col in cols)
+    checked = [col for col in cols if col in df.columns and col != _id_col]
+    # missing values are filled with "NA" and do not make a column categorical
+    types = utils.infer_column_types(
+        (dict(zip(checked, vals)) for vals in df[checked].itertuples(index=False, name=None)),
+        checked,
+        missing=("NA",)
+    )
+    for col in checked:
+        if types[col] != "number" or col in cfg.categorical_columns:
+            final_cols.append(col)
     if not final_cols:
         if indf:
             raise ValueError(
@@ -73,7 +68,7 @@ def _check_vals(df:pd.DataFrame,
         return final_cols
 
 
-def _get_cols(cols: list, df: pd.DataFrame, cfg: dict) -> list:
+def _get_cols(cols: list, df: pd.DataFrame, cfg: utils.Config) -> list:
     """
     Retrieve and validate a list of columns from a DataFrame based on the 
     provided configuration.
@@ -81,7 +76,7 @@ def _get_cols(cols: list, df: pd.DataFrame, cfg: dict) -> list:
         cols (list): A list of column names to retrieve or the string "all" 
         to select all columns.
         df (pd.DataFrame): The DataFrame from which columns will be retrieved.
-        cfg (dict): A configuration dictionary used for validation.
+        cfg (Config): The report configuration used for validation.
     Returns:
         list: A list of validated column names.
     Notes:
@@ -238,6 +233,8 @@ def construct_annotations(path: str,
         path (str): The file path to the data source. If empty, default values
             are returned.
         cols (list): A list of column names to be used for generating metadata.
+        config (str | Config): Path to the configuration file or the loaded 
+            configuration.
     Returns:
         dict: A dictionary containing the following keys:
         - "metadata_tree" (dict): A hierarchical representation of metadata.
@@ -253,8 +250,8 @@ def construct_annotations(path: str,
             "legend": [],
         }
 
+    cfg = utils.load_config(config)
     df = _open_file(path).fillna("NA")
-    cfg = utils.get_config(config)
     metadata_columns = _get_cols(cols=cols, df=df, cfg=cfg)
     colors_css = _get_colors(df=df, cols=metadata_columns)
     legend = _make_legend(df=df, cols=metadata_columns, color_css=colors_css)
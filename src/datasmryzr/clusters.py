@@ -4,11 +4,21 @@ including generating histograms and heatmaps for visualization.
 """
 
 import pandas as pd
+import numpy as np
 import pathlib
 import json
+import hashlib
 import altair as alt
-from datasmryzr.utils import check_file_exists
-from datasmryzr.distances import _get_distances
+from datasmryzr.utils import check_file_exists, read_table
+from datasmryzr.distances import _load_distances
+
+# above this number of pairs per graph, distances are summarised as box 
+# statistics instead of being embedded as individual points
+CLUSTER_MAX_POINTS = 5000
+# number of distances looked up at a time when summarising clusters
+STATISTICS_CHUNK_SIZE = 1000000
+# version of the cluster state file
+CLUSTER_STATE_VERSION = 2
 
 
 def _get_cluster_table(
@@ -16,7 +26,8 @@ def _get_cluster_table(
     ) -> pd.DataFrame:
     try:
     # if check_file_exists(clusters):
-        cluster_df = pd.read_csv(clusters, sep=None, engine='python', dtype=str)
+        # every column is read as text, so the pyarrow parser does not change types
+        cluster_df = read_table(clusters, dtype=str, engine="pyarrow")
         return cluster_df
     except Exception as e:
         print(e)
@@ -30,20 +41,26 @@ def _get_distance_data(
     pass
 
 def _combine_cluster_ids(
-                         clusters:pd.DataFrame) -> pd.DataFrame:
-    
-    thresholds = _get_thresholds(clusters)
-    
-    # print(thresholds)
-    while thresholds:
-        threshold = thresholds.pop(0)
-        # print(thresholds)
-        # print(threshold)
-        if thresholds != []:
-            # print(thresholds)
-            # print(f"Tx:{threshold}")
-            clusters[f"Tx:{thresholds[0]}"] = clusters[[f"Tx:{threshold}", f"Tx:{thresholds[0]}"]].apply(lambda x: ':'.join(x) if not "UC" in f"{x[f'Tx:{threshold}']}" else f"{x[f'Tx:{threshold}']}", axis = 1)
-
+                         clusters:pd.DataFrame,
+                         categorical:bool = False) -> pd.DataFrame:
+    """
+    Function to combine the cluster IDs of each threshold with those of 
+    the larger thresholds (e.g. A, A:B, A:B:C). Isolates that are 
+    unclustered (UC) at a threshold keep that ID at smaller thresholds.
+    Args:
+        clusters (pd.DataFrame): Cluster table.
+        categorical (bool): Store the combined IDs as categoricals, so 
+        that grouping on them uses integer codes.
+    Returns:
+        pd.DataFrame: Cluster table with combined cluster IDs.
+    """
+    cols = [f"Tx:{t}" for t in _get_thresholds(clusters)]
+    for prev, col in zip(cols, cols[1:]):
+        parent = clusters[prev].astype(str)
+        unclustered = parent.str.contains("UC", regex = False).to_numpy()
+        clusters[col] = np.where(unclustered, parent, parent + ":" + clusters[col].astype(str))
+    if categorical:
+        clusters[cols] = clusters[cols].astype("category")
     return clusters
 
 def _get_thresholds(clusters: pd.DataFrame) -> list:
@@ -52,101 +69,109 @@ def _get_thresholds(clusters: pd.DataFrame) -> list:
     
     return thresholds
 
-def _create_tree_for_traversal(
-                               clusters: pd.DataFrame) -> dict:
+def _build_cluster_hierarchy(
+                             clusters: pd.DataFrame) -> dict:
+    """
+    Function to build the cluster hierarchy in a single pass over the 
+    table. Rows are grouped by their path through the (combined) 
+    threshold columns and each path is walked once, from the largest 
+    threshold down, stopping at the first unclustered ("UC") level.
+    Args:
+        clusters (pd.DataFrame): Cluster table with combined cluster IDs.
+    Returns:
+        dict: For each cluster (and the root 'all'): its level, number 
+        of sequences, members (in table order) and children (in order 
+        of appearance).
+    """
     thresholds = _get_thresholds(clusters)
-    tree = {'all': [c for c in clusters[f"Tx:{thresholds[0]}"].unique() if c != "UC"]}
-    while thresholds:
-        threshold = thresholds.pop(0)
-        clusters = clusters[~clusters[f"Tx:{threshold}"].str.contains("UC")]
-        for cl in clusters[f"Tx:{threshold}"].unique():
-            if cl not in tree:
-                tree[cl] = []
-                if thresholds != []:
-                    tree[cl] = list(clusters[clusters[f"Tx:{threshold}"] == cl][f"Tx:{thresholds[0]}"].unique())
-                else:
-                    tree[cl] = []
-    # print(tree)
-    return tree
-
-def _construct_table_dict(tree, node, clusters, visited=None):
-    # print(type(df))
-    # print(type(df))
-    # print(type(df))
-    cols = list(clusters.columns)
-    size = 0
-    # print(node)
-    for col in cols:
-        # print(col)
-        if node in clusters[col].unique():
-            # print(node)
-            tmp = clusters[clusters[col] == node]
-            size = tmp.shape[0]
-            isolates = list(tmp['ID'].unique())
-            # print(isolates)
-    # print(type(df))
-    if visited is None:
-        visited = set()  # Initialize the visited set
-    
-    # print(node)
-   
-    data = {'Cluster ID': node, 'Num seqs':size, '_children': []}  # Store the children of the current node
-    if "UC" not in node:
-        for child in tree[node]:  # Recursively visit children
-            if child not in visited:
-                if "UC" not in child:
-                    data['_children'].append(_construct_table_dict(tree = tree, node = child, clusters = clusters, visited=visited))
-                # dfs_recursive(tree, child, clusters, visited)
-    
-    # print(data)
-                    visited.add(node)    # Mark the node as visited
-    
-    return data
+    cols = [f"Tx:{t}" for t in thresholds]
+    nodes = {'all': {'level': -1, 'size': 0, 'members': [], 'children': []}}
+    if not cols or clusters.empty:
+        return nodes
+    grouped = clusters.groupby(cols, sort = False, dropna = False, observed = True)
+    rows = grouped.indices
+    parts = {}
+    for path in grouped.size().index:
+        path = path if isinstance(path, tuple) else (path,)
+        idx = rows[path]
+        parent = 'all'
+        for level, node in enumerate(path):
+            if not isinstance(node, str) or "UC" in node:
+                break
+            if node not in nodes:
+                nodes[node] = {'level': level, 'size': 0, 'members': [], 'children': []}
+                nodes[parent]['children'].append(node)
+                parts[node] = []
+            nodes[node]['size'] += len(idx)
+            parts[node].append(idx)
+            parent = node
+    ids = clusters[clusters.columns[0]].to_numpy()
+    for node, idx in parts.items():
+        nodes[node]['members'] = list(ids[np.sort(np.concatenate(idx))])
+    return nodes
+
+def _construct_table_dict(nodes: dict, node: str = 'all') -> dict:
+    """
+    Function to construct the nested cluster table.
+    Args:
+        nodes (dict): Cluster hierarchy from _build_cluster_hierarchy.
+        node (str): Cluster to start from.
+    Returns:
+        dict: Cluster ID, number of sequences and children of the cluster.
+    """
+    return {
+        'Cluster ID': node, 
+        'Num seqs': int(nodes[node]['size']), 
+        '_children': [_construct_table_dict(nodes, child) for child in nodes[node]['children']]
+        }
 
 def get_cluster_distances(
         clusters: str,
-        distances: str
-    ) -> pd.DataFrame:
+        distances
+    ) -> dict:
+    """
+    Function to get the distances between the isolates of each cluster. 
+    The distances between the isolates of each cluster at the largest 
+    threshold are stored once, as a condensed upper triangle, and the 
+    clusters below it point to the positions of their members in that 
+    block. The table for a cluster is built in the report when it is 
+    viewed.
+    Args:
+        clusters (str): Path to the cluster table.
+        distances (str | DistanceMatrix): Path to the distances file or 
+        the parsed distance matrix.
+    Returns:
+        dict: Name of the isolate column ("id_col"), the isolate IDs and 
+        condensed distances of each top level cluster ("blocks") and the 
+        block and member positions of each cluster ("clusters").
+    """
     cluster_df = _get_cluster_table(clusters)
-    cluster_df = _combine_cluster_ids(cluster_df)
+    cluster_df = _combine_cluster_ids(cluster_df, categorical = True)
     # print(cluster_df)
-    thresholds = _get_thresholds(cluster_df)
-    dists = {}
-    if check_file_exists(distances) and not cluster_df.empty:
-        distances_df = pd.read_csv(distances, sep = "\t")
-        tree = _create_tree_for_traversal(cluster_df)
-        id_col = distances_df.columns[0]
-        # print(tree)
-        for cl in tree:
-            # print(cl)
-            for th in thresholds:
-                if cl in cluster_df[f"Tx:{th}"].values:
-                    # print("in if : ", cl)
-                    isolates = list(cluster_df[cluster_df[f"Tx:{th}"] == cl]['ID'])
-                    # print(isolates)
-                    ccols = ["Isolate"]
-                    ccols.extend(isolates)
-                    dd = distances_df[distances_df["Isolate"].isin(isolates)][ccols]
-                    # print(dd)
-                    tbl = dd.to_dict(orient='records')
-                    col_dict = []
-                    for col in ccols:
-                        if col == id_col:
-                            dct = {'field': col, 'title': col, 'type': 'string', 'headerFilter':'input',
-                            'headerFilterPlaceholder':f'Search {col}',
-                            'formatter':"textarea"}
-                            col_dict.append(dct)
-                        else:
-                            dct = {'field': col, 'title': col, 'type': 'number', 'headerFilter':'number', 'headerFilterFunc':"<=",
-                            'headerFilterPlaceholder':f'Less than ...',
-                            'formatter':"number",}
-                            col_dict.append(dct)
-                    dists[cl] = {
-                        'table': tbl,
-                        'columns': col_dict
-                    }
-    # print(dists)
-    return dists
+    if cluster_df.empty:
+        return {}
+    dm = _load_distances(distances)
+    nodes = _build_cluster_hierarchy(cluster_df)
+    blocks = {}
+    cluster_dict = {}
+    for top in nodes['all']['children']:
+        # isolates are only compared within their top level cluster
+        shared = np.unique(dm.positions(nodes[top]['members']))
+        sub = dm.subset(shared)
+        blocks[top] = {'ids': list(sub.ids), 'distances': sub.condensed.tolist()}
+        stack = [top]
+        while stack:
+            node = stack.pop(0)
+            stack.extend(nodes[node]['children'])
+            cluster_dict[node] = {
+                'block': top,
+                'members': np.searchsorted(shared, dm.positions(nodes[node]['members'])).tolist(),
+            }
+    return {
+        'id_col': dm.id_col,
+        'blocks': blocks,
+        'clusters': cluster_dict,
+    }
 
 def _save_cluster_table(cluster_table: dict) -> str:
     out_path = pathlib.Path.cwd() / "clusters.json"
@@ -156,15 +181,15 @@ def _save_cluster_table(cluster_table: dict) -> str:
 
 def get_cluster_table(
         clusters: str,
-        distances: str
+        distances
     ) -> str:
     
-    distances_df = _get_distances(distances)
+    dm = _load_distances(distances)
     cluster_df = _get_cluster_table(clusters)
     # print(cluster_df)
     thresholds = _get_thresholds(cluster_df)
     # print(thresholds)
-    if cluster_df.empty or distances_df.empty:
+    if cluster_df.empty or len(dm) == 0:
         return {}
     elif len(thresholds) == 1:
         dct = pd.DataFrame(cluster_df[f"Tx:{thresholds[0]}"].value_counts()).reset_index()
@@ -174,8 +199,8 @@ def get_cluster_table(
         return _save_cluster_table(dct.to_dict(orient='records'))
     else:
         cluster_df = _combine_cluster_ids(cluster_df)
-        tree = _create_tree_for_traversal(cluster_df)
-        cluster_table = _construct_table_dict(tree = tree, node = 'all', clusters= cluster_df)
+        nodes = _build_cluster_hierarchy(cluster_df)
+        cluster_table = _construct_table_dict(nodes = nodes, node = 'all')
         # print(raw_data)
         # cluster_table = _polish_cluster_table(raw_data, 'all')
         
@@ -186,65 +211,574 @@ def _get_clustered(clusters: str, threshold:int) -> pd.DataFrame:
     clustered = clusters[~clusters[f"Tx:{threshold}"].str.contains("UC")][clusters.columns[0]].tolist()
     return clustered
 
+def _iter_clusters(
+        cluster_df: pd.DataFrame,
+        dm,
+        threshold: int,
+        id_col: str
+    ):
+    """
+    Function to iterate over the clusters at a threshold, as positions in 
+    the distance matrix. Isolates that are not in the distance matrix 
+    are ignored.
+    Args:
+        cluster_df (pd.DataFrame): Cluster table with combined cluster IDs.
+        dm (DistanceMatrix): The distance matrix.
+        threshold (int): The SNP threshold.
+        id_col (str): Name of the isolate column of the cluster table.
+    Yields:
+        tuple: Cluster ID, positions of its members and positions of the 
+        isolates in other clusters (in distance matrix order).
+    """
+    labels = cluster_df[f"Tx:{threshold}"].astype(str)
+    clustered = ~labels.str.contains("UC", regex = False).to_numpy()
+    ids = cluster_df[id_col].astype(str).to_numpy()[clustered]
+    labels = labels.to_numpy()[clustered]
+    pos = dm.ids.get_indexer(ids)
+    keep = (pos >= 0) & ~pd.Index(ids).duplicated()
+    codes, names = pd.factorize(labels[keep])
+    pos = pos[keep]
+    order = np.argsort(pos, kind = "stable")
+    codes, pos = codes[order], pos[order]
+    for code, name in enumerate(names):
+        members = codes == code
+        yield name, pos[members], pos[~members]
+
+def _pair_frame(
+        dm,
+        isolate1: np.ndarray,
+        isolate2: np.ndarray,
+        cluster: str,
+        threshold: int,
+        measurement: str
+    ) -> pd.DataFrame:
+    """
+    Function to build the long format distances for pairs of isolates.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        isolate1 (np.ndarray): Positions of the first isolates.
+        isolate2 (np.ndarray): Positions of the second isolates.
+        cluster (str): Cluster ID.
+        threshold (int): SNP threshold.
+        measurement (str): "Intra-cluster distance" or "Inter-cluster distance".
+    Returns:
+        pd.DataFrame: Isolate1, Isolate2 (positions), Distance, Cluster ID, 
+        SNP Threshold and Measurement of each pair.
+    """
+    return pd.DataFrame({
+        "Isolate1": isolate1,
+        "Isolate2": isolate2,
+        "Distance": dm.pairs(isolate1, isolate2),
+        "Cluster ID": cluster,
+        "SNP Threshold": threshold,
+        "Measurement": measurement,
+    })
+
+def _name_pairs(dm, cdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to replace the isolate positions of pairs with their names 
+    and add the pair key (the two names in sorted order).
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        cdf (pd.DataFrame): Output of _cluster_statistics with pairs=False.
+    Returns:
+        pd.DataFrame: Isolate1, Isolate2, Distance, pair, Cluster ID, 
+        SNP Threshold and Measurement of each pair.
+    """
+    first = pd.Series(dm.ids[cdf["Isolate1"].to_numpy()], index = cdf.index, dtype = object)
+    second = pd.Series(dm.ids[cdf["Isolate2"].to_numpy()], index = cdf.index, dtype = object)
+    cdf = cdf.assign(Isolate1 = first, Isolate2 = second)
+    cdf.insert(3, "pair", np.where(first <= second, first + "_" + second, second + "_" + first))
+    return cdf
+
 def _cluster_statistics(
-        cluster_df: str,
-        distances_df: str,
+        cluster_df: pd.DataFrame,
+        distances,
         thresholds: list,
-        id_col: str = None
+        id_col: str = None,
+        pairs: bool = True,
+        panels: set = None
     ) -> pd.DataFrame:
+    """
+    Function to get the distances within (intra) and from (inter) each 
+    cluster at each threshold. Distances are looked up in the distance 
+    matrix for each block of cluster members, rather than filtered from 
+    the long format distances.
+    Args:
+        cluster_df (pd.DataFrame): Cluster table with combined cluster IDs.
+        distances (str | DistanceMatrix): Path to the distances file or 
+        the parsed distance matrix.
+        thresholds (list): SNP thresholds.
+        id_col (str): Name of the isolate column of the cluster table.
+        pairs (bool): Name the isolates of each pair. If False, Isolate1 
+        and Isolate2 are positions in the distance matrix and there is 
+        no pair column (see _name_pairs).
+        panels (set): (threshold, measurement) pairs to get distances for. 
+        Default is both measurements at every threshold.
+    Returns:
+        pd.DataFrame: One row per pair of isolates in a cluster (each pair 
+        once) and per pair of a cluster member and an isolate in another 
+        cluster.
+    Raises:
+        ValueError: If there are no distances between clustered isolates.
+    """
+    dm = _load_distances(distances)
+    id_col = id_col if id_col is not None else cluster_df.columns[0]
+    frames = []
+    for th in thresholds:
+        for cl, members, others in _iter_clusters(cluster_df, dm, th, id_col):
+            if panels is None or (th, "Intra-cluster distance") in panels:
+                # each pair once, later member first
+                upper = np.triu_indices(len(members), 1)
+                frames.append(_pair_frame(dm, members[upper[1]], members[upper[0]], cl, th, "Intra-cluster distance"))
+            if panels is None or (th, "Inter-cluster distance") in panels:
+                frames.append(_pair_frame(dm, np.repeat(members, len(others)), np.tile(others, len(members)), cl, th, "Inter-cluster distance"))
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        raise ValueError("No distances found between clustered isolates.")
+    cdf_all = pd.concat(frames, ignore_index=True)
+    return _name_pairs(dm, cdf_all) if pairs else cdf_all
 
-    
-    
-    intra_clusters = []
+def _cluster_summary(cdf_all: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to summarise the intra and inter cluster distances.
+    Args:
+        cdf_all (pd.DataFrame): Output of _cluster_statistics.
+    Returns:
+        pd.DataFrame: Number of pairs, minimum, quartiles and maximum 
+        distance for each cluster, threshold and measurement.
+    """
+    grouped = cdf_all.groupby(["SNP Threshold", "Cluster ID", "Measurement"], sort = False)["Distance"]
+    summary = grouped.agg(["count", "min", "max"])
+    for name, q in [("q1", 0.25), ("median", 0.5), ("q3", 0.75)]:
+        summary[name] = grouped.quantile(q)
+    return summary[["count", "min", "q1", "median", "q3", "max"]].reset_index()
+
+def _cluster_outliers(cdf_all: pd.DataFrame, summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to get the distances more than 1.5 times the interquartile 
+    range outside the quartiles of their cluster. Pairs with the same 
+    distance are counted rather than listed.
+    Args:
+        cdf_all (pd.DataFrame): Output of _cluster_statistics.
+        summary (pd.DataFrame): Output of _cluster_summary.
+    Returns:
+        pd.DataFrame: SNP Threshold, Cluster ID, Measurement, Distance and 
+        number of pairs of each outlying distance.
+    """
+    keys = ["SNP Threshold", "Cluster ID", "Measurement"]
+    df = cdf_all[keys + ["Distance"]].merge(summary[keys + ["q1", "q3"]], on = keys, how = "left")
+    iqr = df["q3"] - df["q1"]
+    df = df[(df["Distance"] < df["q1"] - 1.5 * iqr) | (df["Distance"] > df["q3"] + 1.5 * iqr)]
+    return df.groupby(keys + ["Distance"], sort = False).size().reset_index(name = "Pairs")
+
+def _digest(*parts) -> str:
+    """
+    Function to get a digest of strings.
+    Args:
+        *parts: Strings.
+    Returns:
+        str: Hex digest.
+    """
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _iter_pair_distances(dm, rows: np.ndarray, cols: np.ndarray = None):
+    """
+    Function to look up distances in chunks of rows, so that the 
+    distances of large clusters are never all held in memory.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        rows (np.ndarray): Positions of the cluster members.
+        cols (np.ndarray): Positions of the isolates in other clusters. If 
+        None, the distances between the members (each pair once).
+    Yields:
+        np.ndarray: Distances.
+    """
+    width = len(rows) if cols is None else len(cols)
+    step = max(1, STATISTICS_CHUNK_SIZE // max(1, width))
+    for start in range(0, len(rows), step):
+        block = np.arange(start, min(start + step, len(rows)))
+        if cols is None:
+            values = dm.pairs(rows[block][:, None], rows[None, :])
+            yield values[block[:, None] < np.arange(len(rows))[None, :]]
+        else:
+            yield dm.pairs(rows[block][:, None], cols[None, :]).ravel()
+
+def _add_counts(
+        distances: np.ndarray,
+        counts: np.ndarray,
+        other_distances: np.ndarray,
+        other_counts: np.ndarray
+    ) -> tuple:
+    """
+    Function to add two sets of counts of distances.
+    Args:
+        distances (np.ndarray): Distances, in order.
+        counts (np.ndarray): Number of pairs with each distance.
+        other_distances (np.ndarray): Distances to add, in order.
+        other_counts (np.ndarray): Number of pairs with each distance to 
+        add (negative to remove pairs).
+    Returns:
+        tuple: Distances (in order) and number of pairs with each distance. 
+        Distances with no pairs are dropped.
+    """
+    if not len(other_distances):
+        return distances, counts
+    if not len(distances):
+        return other_distances, other_counts
+    merged, inverse = np.unique(np.concatenate([distances, other_distances]), return_inverse = True)
+    total = np.zeros(len(merged), dtype = np.int64)
+    np.add.at(total, inverse, np.concatenate([counts, other_counts]))
+    keep = total != 0
+    return merged[keep], total[keep]
+
+def _distance_counts(chunks) -> tuple:
+    """
+    Function to count the pairs with each distance. Non-negative integer 
+    distances are counted in a histogram rather than kept. Missing (NaN) 
+    distances are ignored.
+    Args:
+        chunks (iterable): Arrays of distances.
+    Returns:
+        tuple: Distances (in order) and number of pairs with each distance.
+    """
+    binned = np.zeros(0, dtype = np.int64)
+    distances = np.zeros(0, dtype = np.int64)
+    counts = np.zeros(0, dtype = np.int64)
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        if np.issubdtype(chunk.dtype, np.integer) and chunk.min() >= 0:
+            chunk = np.bincount(chunk)
+            if len(chunk) > len(binned):
+                chunk[:len(binned)] += binned
+                binned = chunk
+            else:
+                binned[:len(chunk)] += chunk
+        else:
+            if np.issubdtype(chunk.dtype, np.floating):
+                chunk = chunk[~np.isnan(chunk)]
+            values, number = np.unique(chunk, return_counts = True)
+            distances, counts = _add_counts(distances, counts, values, number)
+    present = np.flatnonzero(binned)
+    return _add_counts(present, binned[present], distances, counts)
+
+def _counts_statistics(distances: np.ndarray, counts: np.ndarray) -> dict:
+    """
+    Function to get the number of pairs, range, quartiles (linear 
+    interpolation, as pandas) and outliers (more than 1.5 times the 
+    interquartile range outside the quartiles) of counted distances.
+    Args:
+        distances (np.ndarray): Distances, in order.
+        counts (np.ndarray): Number of pairs with each distance.
+    Returns:
+        dict: count, min, q1, median, q3, max and outliers ([distance, 
+        number of pairs]), or None if there are no distances. Integer 
+        distances also keep their counts ([distance, number of pairs]), 
+        so the statistics can be updated (see _update_box_statistics).
+    """
+    n = int(counts.sum())
+    if n == 0:
+        return None
+    cum = np.cumsum(counts)
+    def quantile(q):
+        pos = q * (n - 1)
+        lo = distances[np.searchsorted(cum, np.floor(pos), side = "right")]
+        hi = distances[np.searchsorted(cum, np.ceil(pos), side = "right")]
+        return float(lo + (hi - lo) * (pos - np.floor(pos)))
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    outlying = (distances < q1 - 1.5 * iqr) | (distances > q3 + 1.5 * iqr)
+    stats = {
+        "count": n, "min": distances[0].item(), "q1": q1, "median": median, "q3": q3, "max": distances[-1].item(),
+        "outliers": [[d.item(), int(c)] for d, c in zip(distances[outlying], counts[outlying])],
+    }
+    if np.issubdtype(distances.dtype, np.integer):
+        stats["counts"] = [[int(d), int(c)] for d, c in zip(distances, counts)]
+    return stats
+
+def _box_statistics(chunks) -> dict:
+    """
+    Function to get the box statistics of distances (see 
+    _counts_statistics).
+    Args:
+        chunks (iterable): Arrays of distances.
+    Returns:
+        dict: Output of _counts_statistics, or None if there are no 
+        distances.
+    """
+    return _counts_statistics(*_distance_counts(chunks))
+
+def _update_box_statistics(stats: dict, added, removed) -> dict:
+    """
+    Function to update box statistics with the distances of added pairs 
+    and without those of removed pairs, from the counts kept in the 
+    statistics.
+    Args:
+        stats (dict): Output of _counts_statistics (None if there were no 
+        distances).
+        added (iterable): Arrays of distances of the added pairs.
+        removed (iterable): Arrays of distances of the removed pairs.
+    Returns:
+        dict: Output of _counts_statistics, or None if there are no 
+        distances left.
+    Raises:
+        ValueError: If the removed pairs were not counted.
+    """
+    counts = np.array(stats["counts"] if stats else [], dtype = np.int64).reshape(-1, 2)
+    distances, counts = counts[:, 0], counts[:, 1]
+    distances, counts = _add_counts(distances, counts, *_distance_counts(added))
+    removed_distances, removed_counts = _distance_counts(removed)
+    distances, counts = _add_counts(distances, counts, removed_distances, -removed_counts)
+    if (counts < 0).any():
+        raise ValueError("Removed distances were not counted.")
+    return _counts_statistics(distances, counts)
+
+def _load_cluster_state(state_file: str) -> dict:
+    """
+    Function to read the cluster state saved by a previous run.
+    Args:
+        state_file (str): Path to the cluster state file.
+    Returns:
+        dict: The cluster state, empty if there is no (usable) state file.
+    """
+    if state_file == "" or not check_file_exists(state_file):
+        return {}
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read cluster state {state_file}: {e}")
+        return {}
+    if state.get("version") != CLUSTER_STATE_VERSION:
+        print(f"Ignoring cluster state {state_file} from a different version.")
+        return {}
+    return state
+
+def _save_cluster_state(state_file: str, state: dict) -> None:
+    """
+    Function to save the cluster state for the next run.
+    Args:
+        state_file (str): Path to the cluster state file.
+        state (dict): The cluster state.
+    """
+    try:
+        with open(state_file, 'w') as f:
+            # encoded in one go, json.dump encodes piece by piece in python
+            f.write(json.dumps(state))
+        print(f"Cluster state saved to {state_file}")
+    except OSError as e:
+        print(f"Could not save cluster state {state_file}: {e}")
+
+def _matrix_state(dm) -> dict:
+    """
+    Function to get the part of the distance matrix kept in the cluster 
+    state (isolate names and row digests, see DistanceMatrix).
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+    Returns:
+        dict: Matrix for the cluster state, empty if the matrix has no 
+        row digests.
+    """
+    if dm.row_digests is None:
+        return {}
+    return {'ids': list(map(str, dm.ids)), 'rows': list(dm.row_digests)}
+
+def _unchanged_isolates(dm, previous: dict) -> int:
+    """
+    Function to get the number of isolates at the start of the distance 
+    matrix whose distances to each other are the same as in the previous 
+    run, from the names and row digests of the matrices. Isolates added 
+    at the end of the distance file do not change this.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        previous (dict): Matrix from the previous cluster state.
+    Returns:
+        int: Number of unchanged isolates.
+    """
+    if dm.row_digests is None or not previous:
+        return 0
+    ids = previous.get('ids', [])
+    rows = previous.get('rows', [])
+    n = min(len(ids), len(rows), len(dm))
+    same = (np.asarray(ids[:n], dtype = object) == np.asarray(dm.ids[:n], dtype = object)) & \
+           (np.asarray(rows[:n], dtype = object) == np.asarray(dm.row_digests[:n], dtype = object))
+    return n if same.all() else int(np.argmin(same))
+
+def _report_changes(previous: dict, current: dict) -> None:
+    """
+    Function to print the clusters that are new, changed or gone since 
+    the previous run.
+    Args:
+        previous (dict): Statistics from the previous cluster state.
+        current (dict): Statistics of this run.
+    """
+    def members(statistics):
+        return {(th, cl): c['members'] for th in statistics for cl, c in statistics[th].get('clusters', {}).items()}
+    previous, current = members(previous), members(current)
+    new = [key for key in current if key not in previous]
+    gone = [key for key in previous if key not in current]
+    changed = [key for key in current if key in previous and current[key] != previous[key]]
+    print(f"Clusters since previous run: {len(new)} new, {len(changed)} changed, {len(gone)} no longer present.")
+
+def _cluster_box_statistics(
+        cluster_df: pd.DataFrame,
+        dm,
+        thresholds: list,
+        id_col: str,
+        state: dict = None,
+        track: bool = False
+    ) -> tuple:
+    """
+    Function to get the box statistics of the intra and inter cluster 
+    distances of each cluster at each threshold, reusing the statistics 
+    in the state from a previous run where they cannot have changed. 
+    Whether distances have changed is decided from the row digests of the 
+    distance matrix (see _unchanged_isolates), so no distances are read 
+    to decide. Intra-cluster statistics are reused if the members of the 
+    cluster are the same and unchanged. Inter-cluster statistics of such 
+    clusters are updated with the distances to the isolates that were 
+    added to (or removed from) the other clusters, if those clustered 
+    before are unchanged. Other statistics are computed.
+    Args:
+        cluster_df (pd.DataFrame): Cluster table with combined cluster IDs.
+        dm (DistanceMatrix): The distance matrix.
+        thresholds (list): SNP thresholds.
+        id_col (str): Name of the isolate column of the cluster table.
+        state (dict): Previous cluster state (matrix and statistics).
+        track (bool): Keep what is needed to reuse or save statistics.
+    Returns:
+        tuple: Summary (as _cluster_summary), outliers (as 
+        _cluster_outliers) and the statistics for the new cluster state.
+    """
+    state = state or {}
+    statistics = state.get('statistics', {})
+    unchanged = _unchanged_isolates(dm, state.get('matrix', {})) if track else 0
+    if state:
+        print(f"Distances of {unchanged} of {len(dm)} isolates unchanged since the previous run.")
+    new_state = {}
+    summary = []
+    outliers = []
+    reused = {"Intra-cluster distance": 0, "Inter-cluster distance": 0}
+    updated = 0
+    total = 0
     for th in thresholds:
-        
-        clustered = _get_clustered(cluster_df, th)
-        
-        cdf = distances_df[distances_df["Isolate1"].isin(clustered) & distances_df["Isolate2"].isin(clustered)]
-        # print(cdf)
-        for cl in cluster_df[f"Tx:{th}"].unique():
-            
-            if "UC" not in cl:
-                
-                cldf = cluster_df[cluster_df[f"Tx:{th}"] == cl]
-                
-                if not cdf.empty:
-                    
-                    tmp = cdf[cdf["Isolate1"].isin(cldf[id_col] )]
-                    tmp = tmp[tmp["Isolate2"].isin(cldf[id_col])]
-                    # print(tmp[["Isolate1", "Isolate2"]])
-                    tmp["pair"] = tmp[["Isolate1", "Isolate2"]].apply(lambda x: "_".join(sorted(x)), axis=1)
-                    tmp["Cluster ID"] = f"{cl}"
-                    tmp["SNP Threshold"] = th
-                    tmp["Measurement"] = "Intra-cluster distance"
-                    intra_clusters.append(tmp)
-                inter = cluster_df[(cluster_df[f"Tx:{th}"] != cl) & (~cluster_df[f"Tx:{th}"].str.contains("UC"))]
-                # print(inter)
-                for cluster in inter[f"Tx:{th}"].unique():
-                    intery = inter[inter[f"Tx:{th}"] == cluster]
-                    for i in cldf[id_col].unique(): # get each isolate in the cluster
-                        interx = pd.concat([intery, cldf[cldf[id_col] == i]])
-                        # print(interx)
-                        tmp2 = cdf[cdf["Isolate1"]== i]
-                        tmp2 = tmp2[~tmp2["Isolate2"].isin(interx[id_col])]
-                        tmp2["pair"] = tmp2[["Isolate1", "Isolate2"]].apply(lambda x: "_".join(sorted(x)), axis=1)
-                        tmp2["Cluster ID"] = f"{cl}"
-                        tmp2["SNP Threshold"] = th
-                        tmp2["Measurement"] = "Inter-cluster distance"
-                        # print(tmp2)
-                        intra_clusters.append(tmp2)
-
-
-    cdf_all = pd.concat(intra_clusters, ignore_index=True)
-    cdf_all.drop_duplicates(subset=["pair", "Cluster ID"], inplace=True)
-    return cdf_all
+        clusters = list(_iter_clusters(cluster_df, dm, th, id_col))
+        clustered = np.sort(np.concatenate([c[1] for c in clusters])) if clusters else np.zeros(0, dtype = np.int64)
+        previous = statistics.get(str(th), {})
+        th_state = {'clustered': sorted(map(str, dm.ids[clustered])) if track else None, 'clusters': {}}
+        # isolates added to and removed from the clustered isolates, if 
+        # the distances of those clustered before are unchanged
+        added = removed = None
+        if track and previous.get('clustered') is not None:
+            before = dm.ids.get_indexer(pd.Index(previous['clustered'], dtype = object))
+            if ((before >= 0) & (before < unchanged)).all():
+                added = np.setdiff1d(clustered, before)
+                removed = np.setdiff1d(before, clustered)
+        for cl, members, others in clusters:
+            total += 1
+            key = _digest("\n".join(sorted(map(str, dm.ids[members])))) if track else None
+            old = previous.get('clusters', {}).get(cl, {})
+            stats = {}
+            if key is not None and old.get('members') == key and members[-1] < unchanged:
+                stats["Intra-cluster distance"] = old["stats"].get("Intra-cluster distance")
+                reused["Intra-cluster distance"] += 1
+                inter = old["stats"].get("Inter-cluster distance")
+                if added is not None and not len(added) and not len(removed):
+                    stats["Inter-cluster distance"] = inter
+                    reused["Inter-cluster distance"] += 1
+                elif added is not None and (inter is None or "counts" in inter):
+                    stats["Inter-cluster distance"] = _update_box_statistics(inter, 
+                                                                             _iter_pair_distances(dm, members, added), 
+                                                                             _iter_pair_distances(dm, members, removed))
+                    updated += 1
+            else:
+                stats["Intra-cluster distance"] = _box_statistics(_iter_pair_distances(dm, members))
+            if "Inter-cluster distance" not in stats:
+                stats["Inter-cluster distance"] = _box_statistics(_iter_pair_distances(dm, members, others))
+            th_state['clusters'][cl] = {'members': key, 'stats': stats}
+            for m in ["Intra-cluster distance", "Inter-cluster distance"]:
+                if stats[m] is None:
+                    continue
+                summary.append({"SNP Threshold": th, "Cluster ID": cl, "Measurement": m, 
+                                **{k: stats[m][k] for k in ["count", "min", "q1", "median", "q3", "max"]}})
+                outliers.extend({"SNP Threshold": th, "Cluster ID": cl, "Measurement": m, "Distance": d, "Pairs": c} 
+                                for d, c in stats[m]["outliers"])
+        new_state[str(th)] = th_state
+    if state:
+        _report_changes(statistics, new_state)
+        print(f"Reused intra-cluster statistics of {reused['Intra-cluster distance']}, reused inter-cluster statistics of {reused['Inter-cluster distance']} and updated inter-cluster statistics of {updated} of {total} clusters from the previous run.")
+    summary = pd.DataFrame(summary, columns = ["SNP Threshold", "Cluster ID", "Measurement", "count", "min", "q1", "median", "q3", "max"])
+    outliers = pd.DataFrame(outliers, columns = ["SNP Threshold", "Cluster ID", "Measurement", "Distance", "Pairs"])
+    return summary, outliers, new_state
+
+def _plot_box_statistics(summary: pd.DataFrame, 
+                         outliers: pd.DataFrame, 
+                         threshold: int) -> alt.LayerChart:
+    """
+    Function to plot distances as boxplots drawn from precomputed 
+    statistics, with only the outlying distances as points.
+    Args:
+        summary (pd.DataFrame): Summary of one measurement at one threshold 
+        (as _cluster_summary).
+        outliers (pd.DataFrame): Outliers of one measurement at one 
+        threshold (as _cluster_outliers).
+        threshold (int): The SNP threshold.
+    Returns:
+        alt.LayerChart: The boxplots.
+    """
+    color = alt.Color('Cluster ID:N').scale(scheme='viridis').legend(None)
+    base = alt.Chart(summary).encode(x=alt.X('Cluster ID:N'), color=color)
+    whiskers = base.mark_rule().encode(
+        y=alt.Y('min:Q', title = f"Pairwise Distance (threshold: {threshold})"),
+        y2='max:Q'
+    )
+    boxes = base.mark_bar(size=14, opacity=.3).encode(
+        y='q1:Q',
+        y2='q3:Q',
+        tooltip=['Cluster ID:N', alt.Tooltip('count:Q', title = "Pairs"), 'min:Q', 'q1:Q', 'median:Q', 'q3:Q', 'max:Q']
+    )
+    medians = base.mark_tick(size=14, color="white").encode(y='median:Q')
+    points = alt.Chart(outliers).mark_circle(size=80).encode(
+        y=alt.Y('Distance:Q'),
+        x=alt.X('Cluster ID:N'),
+        color=color,
+        tooltip=['Cluster ID:N', 'Distance:Q', 'Pairs:Q'],
+    )
+    return whiskers + boxes + medians + points
 
 def _generate_cluster_graphs(
         cdf_all: pd.DataFrame,
         clusters: pd.DataFrame,
         id_col: str,
-        thresholds: int
+        thresholds: int,
+        max_points: int = CLUSTER_MAX_POINTS,
+        dm = None,
+        box_stats: tuple = None
     ) -> dict:
+    """
+    Function to plot the cluster sizes and the intra and inter cluster 
+    distances at each threshold. Distances are shown as individual points 
+    if there are no more than max_points pairs, otherwise as boxplots of 
+    precomputed statistics.
+    Args:
+        cdf_all (pd.DataFrame): Output of _cluster_statistics.
+        clusters (pd.DataFrame): Cluster table with combined cluster IDs.
+        id_col (str): Name of the isolate column of the cluster table.
+        thresholds (list): SNP thresholds.
+        max_points (int): Maximum number of pairs shown as points per graph.
+        dm (DistanceMatrix): The distance matrix, if the pairs in cdf_all 
+        are positions rather than names.
+        box_stats (tuple): Precomputed summary and outliers (see 
+        _cluster_box_statistics). If given, cdf_all only needs the 
+        distances of graphs with no more than max_points pairs.
+    Returns:
+        dict: Dictionary containing the plot data.
+    """
     
     charts = []
     for th in thresholds:
@@ -283,24 +817,36 @@ def _generate_cluster_graphs(
         )
         graphs = [unclustered_graph,clustered_graph]
         for m in ["Intra-cluster distance", "Inter-cluster distance"]:
-            box = alt.Chart(cdf_all[(cdf_all["Measurement"] == m) & (cdf_all["SNP Threshold"] == th)]).mark_boxplot(extent='min-max', opacity=.3).encode(
-                    y=alt.Y(f"Distance:Q", sort=None, title = f"Pairwise Distance (threshold: {th})"),
-                    x=alt.X('Cluster ID:N'),
-                    
-                    # tooltip=['pair', 'Distance:Q'],
-                    color=alt.Color('Cluster ID').scale(scheme='viridis').legend(None)
-                    
-                )
-            scatter = alt.Chart(cdf_all[(cdf_all["Measurement"] == m) & (cdf_all["SNP Threshold"] == th)]).mark_circle(size=80).encode(
-                    y=alt.Y(f"Distance:Q", sort=None),
-                    x=alt.X('Cluster ID:N'),
-                    color=alt.Color('Cluster ID').scale(scheme='viridis').legend(None),
-                    
-                    # Add jitter if desired (e.g., using a calculated jitter column or a transform)
-                    # yOffset='jitter_x:Q',
-                    tooltip=['pair', f'Distance'],
-                )
-            chart = box + scatter
+            cdf = cdf_all[(cdf_all["Measurement"] == m) & (cdf_all["SNP Threshold"] == th)]
+            if box_stats is not None:
+                summary = box_stats[0][(box_stats[0]["Measurement"] == m) & (box_stats[0]["SNP Threshold"] == th)]
+                outliers = box_stats[1][(box_stats[1]["Measurement"] == m) & (box_stats[1]["SNP Threshold"] == th)]
+            elif len(cdf) > max_points:
+                summary = _cluster_summary(cdf)
+                outliers = _cluster_outliers(cdf, summary)
+            if (summary["count"].sum() if box_stats is not None else len(cdf)) > max_points:
+                chart = _plot_box_statistics(summary, outliers, th)
+            else:
+                if dm is not None:
+                    cdf = _name_pairs(dm, cdf)
+                box = alt.Chart(cdf).mark_boxplot(extent='min-max', opacity=.3).encode(
+                        y=alt.Y(f"Distance:Q", sort=None, title = f"Pairwise Distance (threshold: {th})"),
+                        x=alt.X('Cluster ID:N'),
+                        
+                        # tooltip=['pair', 'Distance:Q'],
+                        color=alt.Color('Cluster ID').scale(scheme='viridis').legend(None)
+                        
+                    )
+                scatter = alt.Chart(cdf).mark_circle(size=80).encode(
+                        y=alt.Y(f"Distance:Q", sort=None),
+                        x=alt.X('Cluster ID:N'),
+                        color=alt.Color('Cluster ID').scale(scheme='viridis').legend(None),
+                        
+                        # Add jitter if desired (e.g., using a calculated jitter column or a transform)
+                        # yOffset='jitter_x:Q',
+                        tooltip=['pair', f'Distance'],
+                    )
+                chart = box + scatter
             chart = chart.properties(title=f"{m}", width = 500)
             graphs.append(chart)
         graph = alt.hconcat(*graphs).resolve_scale(
@@ -318,17 +864,43 @@ def _generate_cluster_graphs(
 
 def get_cluster_graphs(
         clusters: str,
-        distances: str
+        distances,
+        max_points: int = CLUSTER_MAX_POINTS,
+        state_file: str = ""
     ) -> dict:
+    """
+    Function to plot the cluster sizes and distances. If a cluster state 
+    file is given, the statistics of clusters that have not changed since 
+    the previous run are reused and the file is updated.
+    Args:
+        clusters (str): Path to the cluster table.
+        distances (str | DistanceMatrix): Path to the distances file or 
+        the parsed distance matrix.
+        max_points (int): Maximum number of pairs shown as points per graph.
+        state_file (str): Path to the cluster state file.
+    Returns:
+        dict: Dictionary containing the plot data.
+    """
 
-    distances_df = _get_distances(distances)
+    dm = _load_distances(distances)
     cluster_df = _get_cluster_table(clusters)
     thresholds = _get_thresholds(cluster_df)
     cluster_df = _combine_cluster_ids(cluster_df)
     id_col = cluster_df.columns[0]
     try:
-        cdf_all = _cluster_statistics(cluster_df = cluster_df, distances_df = distances_df, thresholds= thresholds, id_col = id_col)
-        graph = _generate_cluster_graphs(cdf_all = cdf_all, clusters= cluster_df, id_col = id_col, thresholds= thresholds)
+        state = _load_cluster_state(state_file)
+        summary, outliers, statistics = _cluster_box_statistics(cluster_df, dm, thresholds, id_col, 
+                                                               state = state, 
+                                                               track = state_file != "")
+        if summary.empty:
+            raise ValueError("No distances found between clustered isolates.")
+        if state_file != "":
+            _save_cluster_state(state_file, {'version': CLUSTER_STATE_VERSION, 'matrix': _matrix_state(dm), 'statistics': statistics})
+        # individual pairs are only needed for the graphs with few pairs
+        counts = summary.groupby(["SNP Threshold", "Measurement"])["count"].sum()
+        panels = {key for key, count in counts.items() if count <= max_points}
+        cdf_all = _cluster_statistics(cluster_df = cluster_df, distances = dm, thresholds= thresholds, id_col = id_col, pairs = False, panels = panels) if panels else pd.DataFrame(columns = ["Isolate1", "Isolate2", "Distance", "Cluster ID", "SNP Threshold", "Measurement"])
+        graph = _generate_cluster_graphs(cdf_all = cdf_all, clusters= cluster_df, id_col = id_col, thresholds= thresholds, max_points = max_points, dm = dm, box_stats = (summary, outliers))
         return graph
     except Exception as e:
         print(e)
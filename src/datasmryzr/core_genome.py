@@ -6,11 +6,10 @@ SNP density plots for core genome analysis.
 import altair as alt
 import pandas as pd
 import numpy as np
-from Bio import SeqIO
 import pathlib
 import gzip
-import csv
-from datasmryzr.utils import check_file_exists
+import json
+from datasmryzr.utils import check_file_exists, read_table
 
 alt.data_transformers.disable_max_rows()
 
@@ -25,6 +24,8 @@ VCF_COLUMNS_TO_IGNORE = ['#CHROM',
                          'FORMAT',
                          'Reference']
 
+VCF_CHUNK_SIZE = 10000
+
 def check_file_exists(file_path: str) -> bool:
     """
     Check if a file exists at the given path.
@@ -37,33 +38,199 @@ def check_file_exists(file_path: str) -> bool:
     """
     return pathlib.Path(file_path).exists()
 
-def _get_offset(reference:str) -> tuple:
+def _is_gzipped(_file:str) -> bool:
     """
-    Function to get the offset and length of each contig in the reference 
-    genome.
+    Function to check if a file is gzip compressed.
+    Args:
+        _file (str): Path to the file.
+    Returns:
+        bool: True if the file starts with the gzip magic number.
+    """
+    with open(_file, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+def _scan_reference(reference:str) -> list:
+    """
+    Function to get the name and length of each contig in a reference 
+    genome in a single pass, without parsing sequences or features. 
+    Handles fasta, gzipped fasta and genbank (LOCUS/VERSION lines) files.
+    Args:
+        reference (str): Path to the reference genome file.
+    Returns:
+        list: List of [name, length, offset, linebases, linewidth] for each 
+        contig. The last three are the .fai fields and are only set for 
+        uncompressed fasta files (0 otherwise).
+    """
+    gzipped = _is_gzipped(reference)
+    opener = gzip.open if gzipped else open
+    contigs = []
+    is_fasta = False
+    pos = 0
+    with opener(reference, 'rb') as f:
+        for line in f:
+            if line.startswith(b'>'):
+                is_fasta = True
+                name = line[1:].decode().split()[0] if line[1:].strip() else ""
+                contigs.append([name, 0, 0, 0, 0])
+            elif line.startswith(b'LOCUS'):
+                is_fasta = False
+                fields = line.decode().split()
+                length = int(fields[2]) if len(fields) > 2 and fields[2].isdigit() else 0
+                contigs.append([fields[1], length, 0, 0, 0])
+            elif line.startswith(b'VERSION') and not is_fasta and contigs != []:
+                fields = line.decode().split()
+                if len(fields) > 1:
+                    contigs[-1][0] = fields[1]
+            elif is_fasta and contigs != []:
+                bases = len(line.strip())
+                if contigs[-1][1] == 0 and not gzipped:
+                    contigs[-1][2:] = [pos, bases, len(line)]
+                contigs[-1][1] += bases
+            pos += len(line)
+    return contigs
+
+def _reference_key(reference:str) -> dict:
+    """
+    Function to identify a version of a reference genome file, by its 
+    resolved path, size and modification time.
+    Args:
+        reference (str): Path to the reference genome file.
+    Returns:
+        dict: Path, size and mtime (ns) of the reference.
+    """
+    path = pathlib.Path(reference).resolve()
+    stat = path.stat()
+    return {'reference': f"{path}", 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+def _read_reference_index(index_file:str, key:dict) -> list:
+    """
+    Function to read the contigs of a reference genome saved by a 
+    previous run, if they were saved for the same reference file.
+    Args:
+        index_file (str): Path to the reference index file.
+        key (dict): Path, size and mtime of the reference (_reference_key).
+    Returns:
+        list: List of [name, length, offset, linebases, linewidth] for each 
+        contig, empty if the index is missing or for a different file.
+    """
+    if not check_file_exists(index_file):
+        return []
+    try:
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read reference index {index_file}: {e}")
+        return []
+    if not isinstance(index, dict) or any(index.get(k) != v for k, v in key.items()):
+        print(f"Reference index {index_file} is for a different reference - rescanning.")
+        return []
+    return index.get('contigs', [])
+
+def _write_reference_index(index_file:str, key:dict, contigs:list) -> None:
+    """
+    Function to save the contigs of a reference genome for later runs.
+    Args:
+        index_file (str): Path to the reference index file.
+        key (dict): Path, size and mtime of the reference (_reference_key).
+        contigs (list): List of [name, length, offset, linebases, 
+        linewidth] for each contig.
+    """
+    try:
+        with open(index_file, 'w') as f:
+            json.dump({**key, 'contigs': contigs}, f)
+    except OSError as e:
+        print(f"Could not write reference index {index_file}: {e}")
+
+def _index_reference(reference:str, index_file:str = "") -> list:
+    """
+    Function to get the contigs of a reference genome. If `index_file` is 
+    given, the contigs saved there are used when they were saved for the 
+    same reference (resolved path, size and modification time), otherwise 
+    the reference is scanned and the contigs saved there so that later 
+    runs can skip the scan. Nothing is written next to the reference.
     Args:
         reference (str): Path to the reference genome file.
+        index_file (str): Path to the reference index file (no index if "").
+    Returns:
+        list: List of [name, length, offset, linebases, linewidth] for each 
+        contig.
+    """
+    if index_file == "":
+        return _scan_reference(reference)
+    key = _reference_key(reference)
+    contigs = _read_reference_index(index_file, key)
+    if contigs != []:
+        return contigs
+    contigs = _scan_reference(reference)
+    if contigs != []:
+        _write_reference_index(index_file, key, contigs)
+    return contigs
+
+def _contig_key(name:str, strip_version:bool = True) -> str:
+    """
+    Function to normalise a contig name for matching between the 
+    reference, VCF and mask files.
+    Args:
+        name (str): Contig name or accession.
+        strip_version (bool): Remove the accession version 
+        (e.g. NC_000913.3 -> NC_000913).
+    Returns:
+        str: Normalised contig name.
+    """
+    return name.split('.')[0] if strip_version else name
+
+def _contig_offsets(contigs:list, strip_version:bool = True) -> tuple:
+    """
+    Function to get the offset and length of each contig from a list of 
+    contigs.
+    Args:
+        contigs (list): List of contigs as returned by _index_reference.
+        strip_version (bool): Remove accession versions from contig names.
     Returns:            
         tuple: Dictionary with contig information and total length of the 
         reference genome.
     """
-    
     d = {}
     offset = 0
-    records = list(SeqIO.parse(reference, "genbank"))
-    if records == []:
-        records = list(SeqIO.parse(reference, "fasta"))
-    if records != []:
-        for record in records:
-            # print(record.seq)
-            d[record.id.split('.')[0]] = {
-                'offset' : offset, 
-                'length': len(record.seq)
-                }
-            offset += len(record.seq)
-    print(d)
+    for contig in contigs:
+        d[_contig_key(contig[0], strip_version)] = {
+            'offset' : offset, 
+            'length': contig[1]
+            }
+        offset += contig[1]
     return d, offset
 
+def _to_genome_positions(counts:pd.DataFrame, 
+                         _dict:dict, 
+                         strip_version:bool = True) -> pd.DataFrame:
+    """
+    Function to map variant positions on each contig to positions in the 
+    concatenated reference genome. Contigs are matched exactly on their 
+    (normalised) name; variants on contigs that are not in the reference 
+    are dropped.
+    Args:
+        counts (pd.DataFrame): Dataframe with #CHROM, POS and vars columns.
+        _dict (dict): Dictionary containing the contig information.
+        strip_version (bool): Remove accession versions from contig names.
+    Returns:
+        pd.DataFrame: Dataframe with index (genome position) and vars columns.
+    """
+    lookup = {chrom: contig['offset'] for chrom, contig in _dict.items()}
+    chroms = pd.Series(counts['#CHROM'].unique())
+    offsets = chroms.map(
+        lambda x: lookup.get(_contig_key(x, strip_version))
+        )
+    missing = chroms[offsets.isna()].tolist()
+    if missing != []:
+        print(f"Contigs in VCF file not found in the reference - skipping: {missing}")
+    offsets = counts['#CHROM'].map(dict(zip(chroms, offsets)))
+    found = offsets.notna().to_numpy()
+    df = pd.DataFrame({
+        'index': counts['POS'].to_numpy()[found] + offsets.to_numpy()[found].astype(np.int64),
+        'vars': counts['vars'].to_numpy()[found]
+        })
+    return df.groupby('index', sort = False, as_index = False)['vars'].sum()
+
 def get_bin_size(_dict:dict) -> int:
     """
     Calculate the maximum number of bins for SNP density plotting.
@@ -78,9 +245,76 @@ def get_bin_size(_dict:dict) -> int:
     max_bins = max(1, total_length // 5000)
     return max_bins
 
+def _merge_intervals(starts:np.ndarray, ends:np.ndarray) -> tuple:
+    """
+    Function to sort and merge overlapping or adjacent intervals. 
+    Intervals are inclusive of both the start and end position.
+    Args:
+        starts (np.ndarray): Start positions of the intervals.
+        ends (np.ndarray): End positions of the intervals.
+    Returns:
+        tuple: Arrays of merged start and end positions.
+    """
+    if len(starts) == 0:
+        return starts, ends
+    order = np.argsort(starts, kind = 'stable')
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    new = np.concatenate([[True], starts[1:] > reach[:-1] + 1])
+    idx = np.flatnonzero(new)
+    return starts[idx], np.maximum.reduceat(ends, idx)
+
+def _get_mask_intervals(mask_file:str, 
+                        _dict:dict, 
+                        strip_version:bool = True) -> dict:
+    """
+    Function to build a sorted, merged interval index of the masked 
+    regions of each contig, in genome (offset) coordinates.
+    Args:
+        mask_file (str): Path to the mask file (bed format).
+        _dict (dict): Dictionary containing the contig information.
+        strip_version (bool): Remove accession versions from contig names.
+    Returns:
+        dict: Dictionary of contig name to a tuple of start and end arrays.
+    """
+    # bed files are always tab delimited
+    mask = read_table(f"{pathlib.Path(mask_file)}", 
+                      sep = '\t', 
+                      header = None, 
+                      usecols = [0, 1, 2],
+                      names = ['CHR','Pos1','Pos2'])
+    mask['CHR'] = mask['CHR'].astype(str).map(
+        lambda x: _contig_key(x, strip_version)
+        )
+    intervals = {}
+    for chrom, regions in mask.groupby('CHR', sort = False):
+        if chrom not in _dict:
+            print(f"Contig {chrom} in mask file is not in the reference - skipping.")
+            continue
+        offset = _dict[chrom]['offset']
+        intervals[chrom] = _merge_intervals(
+            regions['Pos1'].to_numpy(dtype = np.int64) + offset,
+            regions['Pos2'].to_numpy(dtype = np.int64) + offset
+            )
+    return intervals
+
+def get_masked_totals(intervals:dict) -> dict:
+    """
+    Function to get the number of masked bases in each contig.
+    Args:
+        intervals (dict): Dictionary of merged mask intervals per contig.
+    Returns:
+        dict: Dictionary of contig name to number of masked bases.
+    """
+    return {
+        chrom: int((ends - starts + 1).sum())
+        for chrom, (starts, ends) in intervals.items()
+    }
+
 def check_masked(mask_file:str, 
                  df:pd.DataFrame, 
-                 _dict:dict) -> pd.DataFrame:
+                 _dict:dict,
+                 strip_version:bool = True) -> pd.DataFrame:
     """
     Function to check if a mask file is used and if so, mask the regions 
     in the dataframe.
@@ -88,32 +322,51 @@ def check_masked(mask_file:str,
         mask_file (str): Path to the mask file.
         df (pd.DataFrame): Dataframe containing the SNP data.
         _dict (dict): Dictionary containing the contig information.
+        strip_version (bool): Remove accession versions from contig names.
     Returns:
         pd.DataFrame: Dataframe with masked regions.
     """
 
-    masked = []
+    positions = df['index'].to_numpy(dtype = np.int64)
+    masked = np.zeros(len(positions), dtype = bool)
     if mask_file != '' and pathlib.Path(mask_file).exists():
         
-        mask = pd.read_csv(f"{pathlib.Path(mask_file)}", 
-                           sep = '\t', 
-                           header = None, 
-                           names = ['CHR','Pos1','Pos2'])
-        mask['CHR'] = mask['CHR'].astype(str)
-        
-        for _, row in mask.iterrows():
-            # print(row)
-            offset = _dict[row['CHR']]['offset']
-            masked.extend(
-                range(row['Pos1'] + offset, row['Pos2'] + offset + 1)
+        intervals = _get_mask_intervals(mask_file = mask_file, 
+                                        _dict = _dict, 
+                                        strip_version = strip_version)
+        print(f"Masked bases per contig: {get_masked_totals(intervals)}")
+        if intervals != {}:
+            starts, ends = _merge_intervals(
+                np.concatenate([i[0] for i in intervals.values()]),
+                np.concatenate([i[1] for i in intervals.values()])
                 )
+            idx = np.searchsorted(starts, positions, side = 'right') - 1
+            masked = (idx >= 0) & (positions <= ends[np.maximum(idx, 0)])
         
-    df['mask'] = df['index'].apply(
-                            lambda x: 'masked' if int(x) in masked else 'unmasked'
-                          )
+    df['mask'] = np.where(masked, 'masked', 'unmasked')
     
     return df
 
+def _bin_density(df:pd.DataFrame, 
+                 total_length:int, 
+                 window:int) -> pd.DataFrame:
+    """
+    Function to aggregate variant counts into fixed genomic windows.
+    Args:
+        df (pd.DataFrame): Dataframe with index (genome position), vars 
+        and mask columns.
+        total_length (int): Total length of the reference genome.
+        window (int): Size of each window in bp.
+    Returns:
+        pd.DataFrame: Dataframe with one row per window and mask state 
+        that has variants (start, end, mask and vars columns).
+    """
+    df = df.assign(bin = df['index'].astype(int) // window)
+    binned = df.groupby(['bin', 'mask'], as_index = False)['vars'].sum()
+    binned['start'] = binned['bin'] * window
+    binned['end'] = np.minimum(binned['start'] + window, total_length)
+    return binned[['start', 'end', 'mask', 'vars']]
+
 def get_contig_breaks(_dict:dict) -> list:
     """
     Function to get the contig breaks from a dictionary.
@@ -129,63 +382,142 @@ def get_contig_breaks(_dict:dict) -> list:
     ]
 
 
-def _read_vcf(vcf_file:str) -> str:
+def _open_vcf(vcf_file:str):
     """
-    Function to read a VCF file and yield lines.
+    Function to open a VCF file, gzipped or plain text.
     Args:
         vcf_file (str): Path to the VCF file.
+    Returns:
+        file: Text handle to the VCF file.
+    """
+    if _is_gzipped(vcf_file):
+        return gzip.open(vcf_file, 'rt')
+    return open(vcf_file, 'r')
+
+
+def _iter_vcf_chunks(vcf_file:str, 
+                     chunk_size:int = VCF_CHUNK_SIZE):
+    """
+    Function to read a VCF file in chunks of rows.
+    Meta-information lines (##) are skipped and the #CHROM line is 
+    used as the header, so only `chunk_size` rows are held in memory 
+    at any one time.
+    Args:
+        vcf_file (str): Path to the VCF file.
+        chunk_size (int): Number of variant rows per chunk.
     Yields:
-        str: Lines from the VCF file.
+        tuple: Dataframe chunk and list of sample columns.
     """
     try:
-        with gzip.open(vcf_file, 'rt') as f:
-            return [line.strip() for line in f if not line.startswith('##')]
-    except gzip.BadGzipFile:
-        with open(vcf_file, 'r') as f:
-            return [line.strip() for line in f if not line.startswith('##')]
+        with _open_vcf(vcf_file) as f:
+            line = f.readline()
+            while line.startswith('##'):
+                line = f.readline()
+            header = line.rstrip('\r\n').split('\t')
+            samples = [
+                h for h in header 
+                if h not in VCF_COLUMNS_TO_IGNORE and h != ''
+                ]
+            reader = read_table(f, 
+                                sep = '\t', 
+                                header = None, 
+                                names = header,
+                                dtype = str,
+                                keep_default_na = False,
+                                chunksize = chunk_size)
+            empty = True
+            for chunk in reader:
+                empty = False
+                yield chunk, samples
+            # a VCF with a header but no records
+            if empty:
+                yield pd.DataFrame(columns = header), samples
     except Exception as e:
         raise SystemError(f"Error reading VCF file: {e}")
 
-    
-def _get_vcf(vcf_file:str) -> pd.DataFrame:
+
+def _genotype_matrix(chunk:pd.DataFrame, samples:list) -> np.ndarray:
+    """
+    Function to convert the genotype block of a VCF chunk to an 
+    integer matrix. Reference calls are 0, alternate alleles keep 
+    their allele index and anything else (missing, phased or 
+    multi-allele calls) is -1.
+    Args:
+        chunk (pd.DataFrame): Chunk of the VCF file.
+        samples (list): Sample columns in the VCF file.
+    Returns:
+        np.ndarray: Integer matrix (variants x samples).
+    """
+    gt = chunk[samples].to_numpy(dtype = str)
+    matrix = np.full(gt.shape, -1, dtype = np.int32)
+    is_int = np.char.isdigit(gt)
+    matrix[is_int] = gt[is_int].astype(np.int32)
+    # only an exact "0" is a reference call
+    matrix[(matrix == 0) & (gt != '0')] = -1
+    return matrix
+
+
+def _count_variants(vcf_file:str, 
+                    chunk_size:int = VCF_CHUNK_SIZE) -> pd.DataFrame:
     """
-    Function to read a VCF file and return a list of dictionaries.
+    Function to count the number of non-reference genotypes at each 
+    position in a VCF file.
     Args:
         vcf_file (str): Path to the VCF file.
+        chunk_size (int): Number of variant rows read at a time.
     Returns:
-        df: pd.DataFrame: Dataframe containing the VCF data.
+        pd.DataFrame: Dataframe with #CHROM, POS and vars columns.
     """
-    reader = csv.reader(_read_vcf(vcf_file), delimiter='\t')
-    header = next(reader)
-    rows = list(reader)
-    header = [h for h in header if h not in [""]]
-    print(header)
-    return pd.DataFrame(rows, columns=header)
+    counts = []
+    for chunk, samples in _iter_vcf_chunks(vcf_file, chunk_size = chunk_size):
+        matrix = _genotype_matrix(chunk, samples)
+        tmp = pd.DataFrame({
+            '#CHROM': chunk['#CHROM'].to_numpy(),
+            'POS': chunk['POS'].astype(int).to_numpy(),
+            'vars': np.count_nonzero(matrix != 0, axis = 1)
+        })
+        tmp = tmp[tmp['vars'] > 0]
+        counts.append(tmp.groupby(['#CHROM', 'POS'], sort = False, as_index = False)['vars'].sum())
+    if counts == []:
+        return pd.DataFrame(columns = ['#CHROM', 'POS', 'vars'])
+    df = pd.concat(counts, ignore_index = True)
+    return df.groupby(['#CHROM', 'POS'], sort = False, as_index = False)['vars'].sum()
 
 
 def _get_ref_accession(reference: str) -> str:
+    """
+    Function to get the accession of the first contig in the reference 
+    genome.
+    Args:
+        reference (str): Path to the reference genome file.
+    Returns:
+        str: Accession of the first contig, empty if not found.
+    """
     if pathlib.Path(reference).exists():
-        acc = ""
-        with open(reference, "r") as f:
-            header = f.readline().strip().split("\n")[0]
-
-        if header.startswith(">"):
-            acc = header.strip(">")
-        elif header.startswith("LOCUS"):
-            acc = header.split(" ")[1]
-        return acc
+        contigs = _index_reference(reference)
+        return contigs[0][0] if contigs != [] else ""
     return ""
 
 def _plot_snpdensity(reference:str,
                      vcf_file:str, 
                      mask_file:str = '', 
-                     bar_color:str = '#216cb8') -> alt.Chart:
+                     bar_color:str = '#216cb8',
+                     window:int = 0,
+                     strip_version:bool = True,
+                     index_file:str = "") -> alt.Chart:
     """
     Function to plot the SNP density across a genome.
     Args:
         reference (str): Path to the reference genome file.
         vcf_file (str): Path to the VCF file.
         mask_file (str): Path to the mask file. Default is ''.
+        window (int): Size in bp of the windows used to count variants 
+        before plotting. If 0 (default) every variant position is 
+        embedded in the chart and binned in the browser.
+        strip_version (bool): Match contigs between the reference, VCF and 
+        mask files ignoring accession versions. Default is True.
+        index_file (str): Path to a file to save the contigs of the 
+        reference in, so that later runs can skip scanning it. Default is ''.
     Returns:
         dict: Altair chart object.
     """
@@ -195,46 +527,34 @@ def _plot_snpdensity(reference:str,
         if not check_file_exists(_file):
             raise SystemError(f"File {_file} does not exist.")
     
-    _dict,offset = _get_offset(reference = f"{pathlib.Path(reference)}")
-    acc = _get_ref_accession(reference)
-    chromosomes = list(_dict.keys())
-    results = _get_vcf(vcf_file )    
+    contigs = _index_reference(reference = f"{pathlib.Path(reference)}", index_file = index_file)
+    _dict,offset = _contig_offsets(contigs, strip_version = strip_version)
+    acc = contigs[0][0] if contigs != [] else ""
+    counts = _count_variants(vcf_file)
     _maxbins = get_bin_size(_dict = _dict)
-    _vars = {}
-    for result in results.iterrows():
-        # print(result)
-        for chromosome  in chromosomes: 
-                if chromosome not in _vars: 
-                    _vars[chromosome] = {}
-                if chromosome in result[1]["#CHROM"]: 
-                    pos = int(result[1]["POS"]) 
-                    for col in result[1].keys(): 
-                        if col in VCF_COLUMNS_TO_IGNORE:
-                            continue
-                        if result[1][col] != '0': 
-                            if pos not in _vars[chromosome]: 
-                                _vars[chromosome][pos] = 1
-                            else:
-                                _vars[chromosome][pos] = _vars[chromosome][pos] + 1
-
-    data = {}
-    for var in _vars:
-        for pos in _vars[var]:
-            offset = _dict[var]['offset']
-            data[pos + offset] = _vars[var][pos]
-    df = pd.DataFrame.from_dict(data, orient='index',columns=['vars']).reset_index()
+    df = _to_genome_positions(counts = counts, _dict = _dict, strip_version = strip_version)
     
-    df = check_masked(mask_file = mask_file, df = df,_dict = _dict)
+    df = check_masked(mask_file = mask_file, df = df,_dict = _dict, strip_version = strip_version)
     print(df)
     for_contigs = get_contig_breaks(_dict = _dict)
     domain = ['masked', 'unmasked']
     range_ = ['#d9dcde', f"{bar_color}"]
-    bar = alt.Chart(df).mark_bar(binSpacing=0).encode(
-        x=alt.X('index:Q', bin=alt.Bin(maxbins=_maxbins), title = f"Core genome position (reference: {acc} ).", axis=alt.Axis(ticks=False)),
-        y=alt.Y('vars:Q',title = "Variants observed per 5MB", axis=alt.Axis(ticks=False)),
-        tooltip = [alt.Tooltip('index:Q', title = 'Position'), alt.Tooltip('sum(vars):Q', title = 'SNPs')],
-        color=alt.Color('mask', scale = alt.Scale(domain=domain, range=range_), legend=None)
-    )
+    if window > 0:
+        binned = _bin_density(df = df, total_length = offset, window = window)
+        bar = alt.Chart(binned).mark_bar().encode(
+            x=alt.X('start:Q', title = f"Core genome position (reference: {acc} ).", axis=alt.Axis(ticks=False)),
+            x2='end:Q',
+            y=alt.Y('vars:Q',title = f"Variants observed per {window} bp", axis=alt.Axis(ticks=False)),
+            tooltip = [alt.Tooltip('start:Q', title = 'Start'), alt.Tooltip('end:Q', title = 'End'), alt.Tooltip('vars:Q', title = 'SNPs')],
+            color=alt.Color('mask', scale = alt.Scale(domain=domain, range=range_), legend=None)
+        )
+    else:
+        bar = alt.Chart(df).mark_bar(binSpacing=0).encode(
+            x=alt.X('index:Q', bin=alt.Bin(maxbins=_maxbins), title = f"Core genome position (reference: {acc} ).", axis=alt.Axis(ticks=False)),
+            y=alt.Y('vars:Q',title = "Variants observed per 5MB", axis=alt.Axis(ticks=False)),
+            tooltip = [alt.Tooltip('index:Q', title = 'Position'), alt.Tooltip('sum(vars):Q', title = 'SNPs')],
+            color=alt.Color('mask', scale = alt.Scale(domain=domain, range=range_), legend=None)
+        )
 
     graphs = [bar]
     if for_contigs != []:
@@ -262,7 +582,7 @@ def _plot_stats(core_genome_report:str,
     """
     if check_file_exists(core_genome_report):
         # print(f"Generating core genome statistics plot from {core_genome_report}...")
-        df = pd.read_csv(core_genome_report, sep='\t')
+        df = read_table(core_genome_report)
         df['% Not aligned'] = df['Unaligned'] / df['Length'] * 100
     
         cols = ['% Aligned','% Not aligned', 'Heterozygous',
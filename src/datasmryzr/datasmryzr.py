@@ -24,6 +24,15 @@ from datasmryzr.smryz import smryz
 @click.option('--treebuilder', '-tbd', help="The tree building method", type = str, default = "", show_default = True)
 @click.option('--reference', '-r', help="Specify the path to the reference file that can be used to generate a distribution of variants across a genome. Required if --core-genome is used.", type = str,default = "", show_default = True)
 @click.option('--mask', '-m', help="Specify the path to the mask file that can be used to generate a distribution of variants across a genome. Required if --core-genome is used.", type = str,default = "", show_default = True)
+@click.option('--snp-window', '-sw', help="Window size (bp) used to count variants for the SNP density plot before it is embedded in the report. Keeps the report size independent of the number of variants. If 0, every variant position is embedded and binned in the browser.", type = int, default = 0, show_default = True)
+@click.option('--keep-accession-version', is_flag=True, help="Match contig names between the reference, core genome vcf and mask files including the accession version (e.g. NC_000913.3). By default versions are ignored.")
+@click.option('--heatmap-max-isolates', help="Maximum number of isolates drawn as individual cells in the distance heatmap. Larger matrices are drawn as a single image, ordered by the tree (or clustering) and downsampled, with tiles that can be clicked to view the underlying distances.", type = int, default = 300, show_default = True)
+@click.option('--heatmap-tile', help="Number of isolates per side of each clickable tile in large heatmaps. If 0, the matrix is split into 40 tiles per side.", type = int, default = 0, show_default = True)
+@click.option('--heatmap-reduce', help="Distance shown for each pixel of large heatmaps, which can cover several isolates.", type = click.Choice(["max", "min"]), default = "max", show_default = True)
+@click.option('--cluster-max-points', help="Maximum number of pairs of isolates shown as individual points in each cluster distance graph. Above this, distances are summarised as boxplots (quartiles, range and outliers).", type = int, default = 5000, show_default = True)
+@click.option('--cluster-state', help="Path to a file where cluster statistics are saved. If the file exists from a previous run, statistics of clusters whose members and distances have not changed are reused and updated for added isolates.", type = str, default = "", show_default = True)
+@click.option('--reference-index', help="Path to a file where the contigs of the reference are saved. If the file exists from a previous run for the same reference file (path, size and modification time), the reference is not scanned again.", type = str, default = "", show_default = True)
+@click.option('--jobs', '-j', help="Number of processes used to build the sections of the report (tables, graphs and statistics) at the same time.", type = click.IntRange(min = 1), default = 1, show_default = True)
 @click.option('--template', '-tmpl', help="Specify the path to the template file", type = str, default = f"{pathlib.Path(__file__).parent}/templates/report.html.j2", show_default = True)
 @click.option('--background_color', '-bg', help="Specify the background color of the report", type = str, default = "#343a40", show_default = True)
 @click.option('--font_color', '-fc', help="Specify the font color of the report", type = str, default = "#ffffff", show_default = True)
@@ -50,6 +59,15 @@ def smryzr(output:str,
            treebuilder:str,
            reference:str, 
            mask:str, 
+           snp_window:int,
+           keep_accession_version:bool,
+           heatmap_max_isolates:int,
+           heatmap_tile:int,
+           heatmap_reduce:str,
+           cluster_max_points:int,
+           cluster_state:str,
+           reference_index:str,
+           jobs:int,
            template:str, 
            background_color:str, 
            font_color:str, 
@@ -86,6 +104,15 @@ def smryzr(output:str,
         treebuilder= treebuilder,
         reference = reference,
         mask = mask,
+        snp_window = snp_window,
+        keep_accession_version = keep_accession_version,
+        heatmap_max_isolates = heatmap_max_isolates,
+        heatmap_tile = heatmap_tile,
+        heatmap_reduce = heatmap_reduce,
+        cluster_max_points = cluster_max_points,
+        cluster_state = cluster_state,
+        reference_index = reference_index,
+        jobs = jobs,
         template = template,
         background_color = background_color,
         font_color = font_color,
@@ -4,68 +4,409 @@ including generating histograms and heatmaps for visualization.
 """
 
 import pandas as pd
+import numpy as np
 import pathlib
+import base64
+import hashlib
+import io
+import re
 import altair as alt
-from datasmryzr.utils import check_file_exists
+from datasmryzr.utils import check_file_exists, read_table, sniff_delimiter
 
 
+DISTANCE_CHUNK_SIZE = 1000
+# above this number of isolates the heatmap is drawn as an image
+HEATMAP_MAX_ISOLATES = 300
+# maximum width/height in pixels of the heatmap image
+HEATMAP_MAX_PIXELS = 1000
+# number of tiles per side used for tooltips and drill down
+HEATMAP_TILES = 40
 
-def _get_distances(distances:str) -> pd.DataFrame:
+
+def _condensed_index(n:int, i:np.ndarray, j:np.ndarray) -> np.ndarray:
     """
-    Function to get the pairwise distances between isolates.
+    Function to get the position of pairs (i, j), with i < j, in a 
+    condensed upper-triangle array of an n x n matrix.
     Args:
-        distances (str): Path to the distances file.
+        n (int): Number of isolates.
+        i (np.ndarray): Row positions.
+        j (np.ndarray): Column positions.
     Returns:
-        pd.DataFrame: DataFrame containing the pairwise distances.
+        np.ndarray: Positions in the condensed array.
     """
-    print(f"Getting distances from {distances}")
-    if not check_file_exists(distances):
-        raise FileNotFoundError(f"Distance file {distances} does not exist.")
+    i = np.asarray(i, dtype = np.int64)
+    j = np.asarray(j, dtype = np.int64)
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
 
-    
-    distance = f"{pathlib.Path(distances)}"
-    try:
-        df = pd.read_csv(distance, sep = None, engine='python')
-    
-        names = list(df.columns[1:len(df.columns)])
-        col1 = df.columns[0]
-        
-        melted_df = pd.melt(df, id_vars=[col1], value_vars=names)
-        melted_df = melted_df[melted_df[col1]!= melted_df['variable']]
-        melted_df = melted_df.rename(columns={col1: 'Isolate1'})
-        melted_df = melted_df.rename(columns={'variable': 'Isolate2'})
-        melted_df = melted_df.rename(columns={'value': 'Distance'})
-        return melted_df
-    except:
-        print(f"Error reading the distance file: {distance}")
-        raise SystemError
-   
-
-def _plot_histogram(distances:str,bar_color:str = '#216cb8') -> dict:
+
+def _row_digest(row:np.ndarray) -> str:
+    """
+    Function to get a short digest of the distances of an isolate to the 
+    isolates before it in the matrix.
+    Args:
+        row (np.ndarray): Distances to the preceding isolates.
+    Returns:
+        str: Hex digest.
+    """
+    row = np.ascontiguousarray(row, dtype = np.float64)
+    return hashlib.blake2b(row.tobytes(), digest_size = 8).hexdigest()
+
+def _downcast(condensed:np.ndarray) -> np.ndarray:
+    """
+    Function to store distances as int32 if they are all whole numbers 
+    in the int32 range, with no missing values.
+    Args:
+        condensed (np.ndarray): Distances (float64).
+    Returns:
+        np.ndarray: The distances as int32, or unchanged if any are not 
+        whole numbers.
+    """
+    limit = np.iinfo(np.int32).max
+    if np.all(np.isfinite(condensed)) and np.all(np.abs(condensed) <= limit) \
+            and np.array_equal(condensed, np.round(condensed)):
+        return condensed.astype(np.int32)
+    return condensed
+
+
+class DistanceMatrix:
+    """
+    Pairwise distances between isolates. The distance file is parsed once 
+    and the same object is shared by every part of the report that needs 
+    the distances. Distances are assumed to be symmetric and only the 
+    upper triangle is stored, as a condensed array indexed by integer 
+    isolate codes (the position of each isolate in `ids`).
+    Attributes:
+        condensed (np.ndarray): Upper triangle of the distance matrix, 
+        row by row, without the diagonal.
+        ids (pd.Index): Isolate names, in the order of the matrix rows 
+        and columns.
+        id_col (str): Name of the first column of the distance file.
+        source (str): Path of the distance file, if read from file.
+        row_digests (list): Digest of the distances of each isolate to 
+        the isolates before it (see _row_digest). Rows of isolates added 
+        at the end of the file keep the digests of the rows before them, 
+        so a previous run can tell which distances are unchanged.
+    """
+
+    def __init__(self, 
+                 condensed:np.ndarray, 
+                 ids:list, 
+                 id_col:str = "Isolate",
+                 source:str = "",
+                 row_digests:list = None):
+        self.condensed = condensed
+        self.ids = pd.Index(ids)
+        self.id_col = id_col
+        self.source = source
+        self.row_digests = row_digests
+        # .npy file the distances are memory mapped from, if shared
+        self.mapped = ""
+
+    @classmethod
+    def from_square(cls, 
+                    matrix:np.ndarray, 
+                    ids:list, 
+                    id_col:str = "Isolate") -> "DistanceMatrix":
+        """
+        Function to create a distance matrix from a square array.
+        Args:
+            matrix (np.ndarray): Square matrix of distances.
+            ids (list): Isolate names.
+            id_col (str): Name of the isolate column.
+        Returns:
+            DistanceMatrix: The distance matrix.
+        """
+        matrix = np.asarray(matrix)
+        condensed = matrix[np.triu_indices(len(ids), 1)]
+        return cls(condensed = condensed, 
+                   ids = ids, 
+                   id_col = id_col, 
+                   row_digests = [_row_digest(row[:i]) for i, row in enumerate(matrix)])
+
+    @classmethod
+    def from_file(cls, 
+                  distances:str, 
+                  chunk_size:int = DISTANCE_CHUNK_SIZE) -> "DistanceMatrix":
+        """
+        Function to read a distance matrix file. Rows are read in chunks 
+        and only their upper triangle is kept, so the full square matrix 
+        is never held in memory.
+        Args:
+            distances (str): Path to the distances file.
+            chunk_size (int): Number of rows read at a time.
+        Returns:
+            DistanceMatrix: The parsed distance matrix.
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            SystemError: If the file can not be read as a square matrix.
+        """
+        print(f"Getting distances from {distances}")
+        if not check_file_exists(distances):
+            raise FileNotFoundError(f"Distance file {distances} does not exist.")
+        distance = f"{pathlib.Path(distances)}"
+        try:
+            sep = sniff_delimiter(distance)
+            header = read_table(distance, sep = sep, index_col = 0, nrows = 0)
+            ids = header.columns.astype(str)
+            n = len(ids)
+            seen = 0
+            # the type is only known once every chunk has been read
+            condensed = np.zeros(n * (n - 1) // 2, dtype = np.float64)
+            digests = [None] * n
+            for chunk in read_table(distance, sep = sep, index_col = 0, chunksize = chunk_size):
+                values = chunk.to_numpy(dtype = np.float64)
+                for name, row in zip(chunk.index.astype(str), values):
+                    i = ids.get_loc(name)
+                    start = _condensed_index(n, i, i + 1)
+                    condensed[start:start + n - i - 1] = row[i + 1:]
+                    digests[i] = _row_digest(row[:i])
+                    seen += 1
+            if seen != n:
+                raise ValueError(f"Expected {n} rows, found {seen}.")
+            condensed = _downcast(condensed)
+            return cls(condensed = condensed, 
+                       ids = ids, 
+                       id_col = header.index.name or "Isolate",
+                       source = distances,
+                       row_digests = digests)
+        except:
+            print(f"Error reading the distance file: {distance}")
+            raise SystemError
+
+    def share(self, directory:str) -> "DistanceMatrix":
+        """
+        Function to save the distances to a .npy file and memory map them, 
+        so that the matrix can be passed to other processes without 
+        copying the distances (each process maps the same file).
+        Args:
+            directory (str): Directory to save the distances to.
+        Returns:
+            DistanceMatrix: Distance matrix backed by the saved file.
+        """
+        path = pathlib.Path(directory) / "distances.npy"
+        np.save(path, self.condensed)
+        dm = DistanceMatrix(condensed = np.load(path, mmap_mode = "r"), 
+                            ids = self.ids, 
+                            id_col = self.id_col, 
+                            source = self.source,
+                            row_digests = self.row_digests)
+        dm.mapped = f"{path}"
+        return dm
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        if self.mapped:
+            state["condensed"] = None
+        return state
+
+    def __setstate__(self, state:dict):
+        self.__dict__.update(state)
+        if self.mapped:
+            self.condensed = np.load(self.mapped, mmap_mode = "r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, ids:list) -> np.ndarray:
+        """
+        Function to get the integer codes (matrix positions) of a list of 
+        isolates. Isolates that are not in the matrix are dropped.
+        Args:
+            ids (list): Isolate names.
+        Returns:
+            np.ndarray: Positions of the isolates in the matrix.
+        """
+        idx = self.ids.get_indexer(pd.Index(ids).astype(str))
+        return idx[idx >= 0]
+
+    def pairs(self, i:np.ndarray, j:np.ndarray) -> np.ndarray:
+        """
+        Function to look up the distances between pairs of isolates.
+        Args:
+            i (np.ndarray): Integer codes of the first isolates.
+            j (np.ndarray): Integer codes of the second isolates.
+        Returns:
+            np.ndarray: Distances (0 where i == j).
+        """
+        i = np.asarray(i, dtype = np.int64)
+        j = np.asarray(j, dtype = np.int64)
+        lo = np.minimum(i, j)
+        hi = np.maximum(i, j)
+        same = lo == hi
+        out = np.zeros(np.broadcast(lo, hi).shape, dtype = self.condensed.dtype)
+        out[~same] = self.condensed[_condensed_index(len(self), lo[~same], hi[~same])]
+        return out
+
+    def submatrix(self, idx:np.ndarray) -> np.ndarray:
+        """
+        Function to get the square matrix of distances for a subset of 
+        isolates.
+        Args:
+            idx (np.ndarray): Integer codes of the isolates.
+        Returns:
+            np.ndarray: Square matrix of distances.
+        """
+        idx = np.asarray(idx, dtype = np.int64)
+        return self.pairs(idx[:, None], idx[None, :])
+
+    def subset(self, idx:np.ndarray) -> "DistanceMatrix":
+        """
+        Function to get the distance matrix of a subset of isolates, 
+        without building the square matrix.
+        Args:
+            idx (np.ndarray): Integer codes of the isolates, in the order 
+            they should be in the new matrix.
+        Returns:
+            DistanceMatrix: Distance matrix of the subset.
+        """
+        idx = np.asarray(idx, dtype = np.int64)
+        if len(idx) == len(self) and np.array_equal(idx, np.arange(len(self))):
+            return self
+        rows = [self.pairs(i, idx[k + 1:]) for k, i in enumerate(idx[:-1])]
+        condensed = np.concatenate(rows) if rows else np.zeros(0, dtype = self.condensed.dtype)
+        return DistanceMatrix(condensed = condensed.astype(self.condensed.dtype), 
+                              ids = self.ids[idx], 
+                              id_col = self.id_col, 
+                              source = self.source)
+
+    def to_frame(self, ids:list = None) -> pd.DataFrame:
+        """
+        Function to get the (sub)matrix as a square dataframe, with the 
+        isolate names in the first column as in the distance file.
+        Args:
+            ids (list): Isolates to include. Default is all isolates.
+        Returns:
+            pd.DataFrame: Square dataframe of distances.
+        """
+        idx = np.arange(len(self)) if ids is None else self.positions(ids)
+        names = self.ids[idx]
+        df = pd.DataFrame(self.submatrix(idx), columns = names)
+        df.insert(0, self.id_col, names)
+        return df
+
+    def iter_rows(self):
+        """
+        Function to get the rows of the square matrix one at a time, as 
+        they are read from the distance file (distances as text, missing 
+        distances empty), without building the square matrix.
+        Yields:
+            dict: Isolate name and the distances to every isolate.
+        """
+        names = list(self.ids)
+        idx = np.arange(len(self))
+        is_int = np.issubdtype(self.condensed.dtype, np.integer)
+        for i, name in enumerate(names):
+            values = self.pairs(np.full(len(self), i), idx)
+            if is_int:
+                text = values.astype(str).tolist()
+            else:
+                text = [
+                    "" if np.isnan(v) else f"{int(v)}" if v.is_integer() else f"{v}"
+                    for v in values.tolist()
+                ]
+            row = {self.id_col: name}
+            row.update(zip(names, text))
+            yield row
+
+    def histogram(self, bins:int = 50) -> pd.DataFrame:
+        """
+        Function to count the number of pairs of isolates at each distance. 
+        Each pair is counted once. Integer distances are counted per value, 
+        other distances are binned and missing (NaN) distances are skipped.
+        Args:
+            bins (int): Number of bins used for non-integer distances.
+        Returns:
+            pd.DataFrame: DataFrame with Distance and Frequency columns (and 
+            Distance_end, the upper bin edge, for binned distances).
+        """
+        if np.issubdtype(self.condensed.dtype, np.integer):
+            low = int(self.condensed.min()) if len(self.condensed) else 0
+            counts = np.bincount(self.condensed - low)
+            values = np.flatnonzero(counts)
+            return pd.DataFrame({
+                'Distance': values + low,
+                'Frequency': counts[values],
+            })
+        # missing distances are not counted
+        values = self.condensed[~np.isnan(self.condensed)]
+        counts, edges = np.histogram(values, bins = bins)
+        return pd.DataFrame({
+            'Distance': edges[:-1],
+            'Distance_end': edges[1:],
+            'Frequency': counts,
+        })
+
+    def melt(self, ids:list = None) -> pd.DataFrame:
+        """
+        Function to get the distances in long format (one row per ordered 
+        pair of different isolates). This is n^2 rows, so should only be 
+        used for small subsets of isolates.
+        Args:
+            ids (list): Isolates to include. Default is all isolates.
+        Returns:
+            pd.DataFrame: DataFrame with Isolate1, Isolate2 and Distance 
+            columns.
+        """
+        idx = np.arange(len(self)) if ids is None else self.positions(ids)
+        n = len(idx)
+        rows = np.tile(idx, n)
+        cols = np.repeat(idx, n)
+        keep = rows != cols
+        return pd.DataFrame({
+            'Isolate1': self.ids[rows[keep]],
+            'Isolate2': self.ids[cols[keep]],
+            'Distance': self.pairs(rows[keep], cols[keep]),
+        })
+
+
+def _load_distances(distances) -> DistanceMatrix:
+    """
+    Function to get a distance matrix, reading it from file if a path 
+    is given.
+    Args:
+        distances (str | DistanceMatrix): Path to the distances file or 
+        an already parsed distance matrix.
+    Returns:
+        DistanceMatrix: The distance matrix.
+    """
+    if isinstance(distances, DistanceMatrix):
+        return distances
+    return DistanceMatrix.from_file(distances)
+
+
+def _plot_histogram(distances,bar_color:str = '#216cb8') -> dict:
     """
     Function to plot the pairwise distances between isolates as a histogram.
     Args:
-        distances (str): Path to the distances file.
+        distances (str | DistanceMatrix): Path to the distances file or 
+        a parsed distance matrix.
     Returns:
         dict: Dictionary containing the plot data.
     """
-    df = _get_distances(distances)
+    dm = _load_distances(distances)
     try:
-        
-        chart = alt.Chart(df).mark_bar(color = f"{bar_color}").encode(
-                            alt.X(
-                                'Distance', 
-                                axis = alt.Axis(
-                                    title = 'Pairwise SNP distance'
-                                    )
-                                    ),
-                            y=alt.Y(
-                                'count()', 
-                                axis= alt.Axis(
-                                    title = "Frequency"
-                                    )
-                                    )
-                        ).properties(
+        df = dm.histogram()
+        x = alt.X(
+                'Distance:Q', 
+                axis = alt.Axis(
+                    title = 'Pairwise SNP distance'
+                    )
+                    )
+        y = alt.Y(
+                'Frequency:Q', 
+                axis= alt.Axis(
+                    title = "Frequency"
+                    )
+                    )
+        if 'Distance_end' in df.columns:
+            chart = alt.Chart(df).mark_bar(color = f"{bar_color}").encode(
+                                x, x2 = 'Distance_end:Q', y = y
+                            )
+        else:
+            chart = alt.Chart(df).mark_bar(color = f"{bar_color}").encode(
+                                x, y = y
+                            )
+        chart = chart.properties(
                                 width=1200,
                                 height=200
                             )
@@ -75,15 +416,217 @@ def _plot_histogram(distances:str,bar_color:str = '#216cb8') -> dict:
         print(f"Error generating histogram: {e}")
         return {}
 
-def _plot_heatmap(distances:str) -> dict:
+def _tree_order(tree:str) -> list:
+    """
+    Function to get the tip labels of a newick tree, in the order they 
+    are drawn.
+    Args:
+        tree (str): Newick string.
+    Returns:
+        list: Tip labels.
+    """
+    tips = re.findall(r"[(,]\s*('[^']*'|[^(),:;\s\[]+)", tree)
+    return [tip.strip("'") for tip in tips]
+
+def _nearest_neighbour_order(dm:DistanceMatrix) -> np.ndarray:
+    """
+    Function to order isolates so that similar isolates are next to each 
+    other, by a greedy nearest neighbour chain: starting from the first 
+    isolate, the closest isolate not yet placed is added next. Only one 
+    row of distances is looked up at a time.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+    Returns:
+        np.ndarray: Integer codes of the isolates in display order.
+    """
+    n = len(dm)
+    order = np.zeros(n, dtype = np.int64)
+    remaining = np.ones(n, dtype = bool)
+    if n == 0:
+        return order
+    remaining[0] = False
+    for k in range(1, n):
+        candidates = np.flatnonzero(remaining)
+        dists = dm.pairs(np.full(len(candidates), order[k - 1]), candidates).astype(float)
+        # missing distances are placed last
+        dists[np.isnan(dists)] = np.inf
+        order[k] = candidates[np.argmin(dists)]
+        remaining[order[k]] = False
+    return order
+
+def _order_isolates(dm:DistanceMatrix, tree:str = "") -> np.ndarray:
+    """
+    Function to order the isolates of a distance matrix for display. 
+    Isolates are ordered by the tips of the tree if one is given, 
+    otherwise by a nearest neighbour chain of the distances.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        tree (str): Newick string of the tree.
+    Returns:
+        np.ndarray: Integer codes of the isolates in display order.
+    """
+    if tree != "":
+        idx = dm.positions(_tree_order(tree))
+        idx = idx[~pd.Index(idx).duplicated()]
+        if len(idx) > 0:
+            rest = np.setdiff1d(np.arange(len(dm)), idx)
+            return np.concatenate([idx, rest])
+    return _nearest_neighbour_order(dm)
+
+def _block_reduce(dm:DistanceMatrix, 
+                  idx:np.ndarray, 
+                  block:int, 
+                  reduce:str = "max") -> np.ndarray:
+    """
+    Function to downsample the (ordered) distance matrix into square 
+    blocks, keeping the maximum or minimum distance of each block. The 
+    matrix is processed one strip of rows at a time.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        idx (np.ndarray): Integer codes of the isolates in display order.
+        block (int): Number of isolates per block.
+        reduce (str): "max" or "min".
+    Returns:
+        np.ndarray: Matrix of the reduced distances of each block.
+    """
+    ufunc = np.maximum if reduce == "max" else np.minimum
+    idx = np.asarray(idx)
+    starts = np.arange(0, len(idx), block)
+    out = np.zeros((len(starts), len(starts)), dtype = dm.condensed.dtype)
+    for r, start in enumerate(starts):
+        strip = dm.pairs(idx[start:start + block, None], idx[None, :])
+        out[r] = ufunc.reduce(ufunc.reduceat(strip, starts, axis = 1), axis = 0)
+    return out
+
+def _to_png(matrix:np.ndarray, vmin:float, vmax:float) -> str:
+    """
+    Function to render a matrix of distances as a png image.
+    Args:
+        matrix (np.ndarray): Matrix to render.
+        vmin (float): Distance at the start of the colour scale.
+        vmax (float): Distance at the end of the colour scale.
+    Returns:
+        str: Image as a base64 data URI.
+    """
+    import matplotlib.pyplot as plt
+    buffer = io.BytesIO()
+    plt.imsave(buffer, matrix, cmap = "Oranges_r", vmin = vmin, vmax = vmax, format = "png")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+def _plot_raster_heatmap(dm:DistanceMatrix, 
+                         tree:str = "",
+                         tile:int = 0,
+                         reduce:str = "max") -> dict:
+    """
+    Function to plot a large distance matrix as a single image. Rows and 
+    columns are ordered by the tree or by clustering, and the matrix is 
+    downsampled to at most HEATMAP_MAX_PIXELS pixels per side. A grid of 
+    tiles shows the minimum and maximum distance in each block and 
+    clicking on a tile shows its full resolution distances.
+    Args:
+        dm (DistanceMatrix): The distance matrix.
+        tree (str): Newick string of the tree used to order isolates.
+        tile (int): Number of isolates per tile, 0 to choose 
+        automatically (HEATMAP_TILES tiles per side).
+        reduce (str): Show the "max" or "min" distance of each pixel block.
+    Returns:
+        dict: Dictionary containing the plot data.
+    """
+    idx = _order_isolates(dm, tree = tree)
+    n = len(idx)
+    pixel = -(-n // HEATMAP_MAX_PIXELS)
+    tile = tile if tile > 0 else -(-n // HEATMAP_TILES)
+    # tiles are made of whole pixels
+    tile = max(1, -(-tile // pixel)) * pixel
+    vmin = float(dm.condensed.min()) if len(dm.condensed) else 0
+    vmax = float(dm.condensed.max()) if len(dm.condensed) else 0
+    maxs = _block_reduce(dm, idx, pixel, "max")
+    mins = _block_reduce(dm, idx, pixel, "min")
+    image = pd.DataFrame({
+        'x': [n / 2], 
+        'y': [n / 2], 
+        'url': [_to_png(maxs if reduce == "max" else mins, vmin, vmax)]
+        })
+    # tile statistics from the pixel blocks
+    step = tile // pixel
+    starts = np.arange(0, maxs.shape[0], step)
+    tile_max = np.maximum.reduceat(np.maximum.reduceat(maxs, starts, axis = 0), starts, axis = 1)
+    tile_min = np.minimum.reduceat(np.minimum.reduceat(mins, starts, axis = 0), starts, axis = 1)
+    bounds = np.append(np.arange(0, n, tile), n)
+    rows, cols = np.meshgrid(np.arange(len(bounds) - 1), np.arange(len(bounds) - 1), indexing = "ij")
+    rows, cols = rows.ravel(), cols.ravel()
+    names = dm.ids[idx]
+    tiles = pd.DataFrame({
+        'row_start': bounds[rows],
+        'row_end': bounds[rows + 1],
+        'col_start': bounds[cols],
+        'col_end': bounds[cols + 1],
+        'Rows': [f"{names[a]} ... {names[b - 1]}" for a, b in zip(bounds[rows], bounds[rows + 1])],
+        'Columns': [f"{names[a]} ... {names[b - 1]}" for a, b in zip(bounds[cols], bounds[cols + 1])],
+        'Minimum': tile_min.ravel(),
+        'Maximum': tile_max.ravel(),
+    })
+    x_scale = alt.Scale(domain = [0, n], nice = False)
+    y_scale = alt.Scale(domain = [0, n], nice = False, reverse = True)
+    size = 800
+    img = alt.Chart(image).mark_image(width = size, height = size).encode(
+        x = alt.X('x:Q', scale = x_scale, axis = None),
+        y = alt.Y('y:Q', scale = y_scale, axis = None),
+        url = 'url:N'
+    )
+    grid = alt.Chart(tiles).mark_rect(opacity = 0.01, cursor = "pointer").encode(
+        x = alt.X('col_start:Q', scale = x_scale, axis = None),
+        x2 = 'col_end:Q',
+        y = alt.Y('row_start:Q', scale = y_scale, axis = None),
+        y2 = 'row_end:Q',
+        color = alt.Color('Maximum:Q', title = "Distance").scale(
+            scheme = "oranges", reverse = True, domain = [vmin, vmax]
+            ),
+        tooltip = ['Rows:N', 'Columns:N', 'Minimum:Q', 'Maximum:Q']
+    )
+    link = pathlib.Path(dm.source).stem.replace(' ', '-').replace('_', '-').lower() if dm.source != "" else ""
+    chart = alt.layer(img, grid).properties(
+        width = size, 
+        height = size,
+        usermeta = {
+            'drilldown': {
+                'ids': list(names), 
+                'id_col': dm.id_col, 
+                'table': link
+                }
+            }
+    )
+    return chart.to_json()
+
+def _plot_heatmap(distances, 
+                  tree:str = "",
+                  max_isolates:int = HEATMAP_MAX_ISOLATES,
+                  tile:int = 0,
+                  reduce:str = "max") -> dict:
     """
     Function to plot the pairwise distances between isolates as a heatmap.
     Args:
-        distances (str): Path to the distances file.
+        distances (str | DistanceMatrix): Path to the distances file or 
+        a parsed distance matrix.
+        tree (str): Newick string of the tree, used to order isolates in 
+        large heatmaps.
+        max_isolates (int): Above this number of isolates the heatmap is 
+        drawn as a single image instead of one mark per pair.
+        tile (int): Number of isolates per tile in large heatmaps, 0 to 
+        choose automatically.
+        reduce (str): Show the "max" or "min" distance of each block of 
+        isolates in large heatmaps.
     Returns:
         dict: Dictionary containing the plot data.
     """
-    df = _get_distances(distances)
+    dm = _load_distances(distances)
+    if len(dm) > max_isolates:
+        try:
+            return _plot_raster_heatmap(dm, tree = tree, tile = tile, reduce = reduce)
+        except Exception as e:
+            print(f"Error generating heatmap: {e}")
+            return {}
+    df = dm.melt()
     # print(df)
     number_of_isolates = len(df['Isolate1'].unique())
     try:
@@ -103,4 +646,4 @@ def _plot_heatmap(distances:str) -> dict:
         return chart
     except Exception as e:
         print(f"Error generating histogram: {e}")
-        return {}
\ No newline at end of file
+        return {}
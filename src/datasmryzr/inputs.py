@@ -0,0 +1,69 @@
+"""
+This module provides a registry of the input files of a report, so that
+each file is parsed once and the menu, the number of isolates and the
+tables are all made from that parse.
+"""
+
+import pathlib
+
+
+class InputFile:
+    """
+    An input file of the report, as recorded while its rows are read.
+    Attributes:
+        path (str): Path to the file.
+        delimiter (str): Delimiter of the file ("json" for JSON files).
+        columns (list): Columns of the file.
+        n_rows (int): Number of rows read.
+        ids (set): Values of the first column (tabular files only).
+        complete (bool): Whether every row of the file has been read.
+    """
+
+    def __init__(self, path:str, delimiter:str, columns:list):
+        self.path = path
+        self.delimiter = delimiter
+        self.columns = list(columns)
+        self.n_rows = 0
+        self.ids = set()
+        self.complete = False
+
+    @property
+    def title(self) -> str:
+        return pathlib.Path(self.path).stem.replace('_', ' ').replace('-', ' ')
+
+
+class InputRegistry:
+    """
+    The input files of a report, by path. Files are recorded by
+    `tables.generate_table` as their rows are read.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def __contains__(self, path:str) -> bool:
+        return f"{path}" in self.files and self.files[f"{path}"].complete
+
+    def __getitem__(self, path:str) -> InputFile:
+        return self.files[f"{path}"]
+
+    def track(self, path:str, delimiter:str, columns:list, rows):
+        """
+        Function to record a file while its rows are read.
+        Args:
+            path (str): Path to the file.
+            delimiter (str): Delimiter of the file ("json" for JSON files).
+            columns (list): Columns of the file.
+            rows (iterable): Rows of the file (dictionaries).
+        Yields:
+            dict: The rows of the file.
+        """
+        record = InputFile(f"{path}", delimiter, columns)
+        self.files[record.path] = record
+        id_col = columns[0] if columns and delimiter != "json" else None
+        for row in rows:
+            record.n_rows += 1
+            if id_col is not None and row.get(id_col):
+                record.ids.add(row[id_col])
+            yield row
+        record.complete = True
@@ -5,11 +5,10 @@ for pangenome analysis.
 
 import altair as alt
 import pandas as pd
-from Bio import SeqIO
 import pathlib
 import gzip
 import csv
-from datasmryzr.utils import check_file_exists, _open_df, _get_pangenome_acc
+from datasmryzr.utils import check_file_exists, read_table, _open_df, _get_pangenome_acc
 
 alt.data_transformers.disable_max_rows()
 
@@ -87,7 +86,7 @@ def _pangenome_summary(
     raw,ids = _generate_datatable(pangenome_rtab, pangenome_characterization)
     colname = colname if pangenome_characterization == "" else "specific_class"
     try:
-        grps = pd.read_csv(groups, sep="\t", header=0, dtype=str, names = ["variable","group"])
+        grps = read_table(groups, header=0, dtype=str, names = ["variable","group"])
         if len(list(grps["group"].unique())) == 1:
             colname = "panaroo_class"
     except:
@@ -199,7 +198,7 @@ def do_pangenome_graph(
     colname = "panaroo_class" if pangenome_characterization == "" else "specific_class"
     print(raw)
     try:
-        grps = pd.read_csv(groups, sep="\t", header=0, dtype=str, names = ["variable","group"])
+        grps = read_table(groups, header=0, dtype=str, names = ["variable","group"])
     except:
         grps = pd.DataFrame()
     
@@ -4,23 +4,26 @@ It includes functions for processing input files, generating visualizations, and
 a summary report using a Jinja2 template.
 """
 
-from datasmryzr.annotate import construct_annotations
-from datasmryzr.utils import check_file_exists, get_config
-from datasmryzr.tables import generate_table
-from datasmryzr.core_genome import _plot_snpdensity, _plot_stats
-from datasmryzr.distances import _plot_histogram, _plot_heatmap
+from datasmryzr.utils import check_file_exists, load_config, read_table
+from datasmryzr.tables import generate_table, read_spool, iter_json, _load_json
 from datasmryzr.tree import _get_tree_string
-from datasmryzr.pangenome import _pangenome_summary, do_pangenome_graph
-from datasmryzr.summary import summary_graphs
-from datasmryzr.clusters import get_cluster_table, get_cluster_graphs,get_cluster_distances
+from datasmryzr.inputs import InputRegistry
 
-import pandas as pd
+import os
 import pathlib
-import jinja2
+import functools
 import datetime
+import tempfile
+from typing import TYPE_CHECKING
 
+# the section modules (and pandas, altair, biopython and matplotlib) are 
+# imported by the functions that build each section, only when the 
+# section is in the report
+if TYPE_CHECKING:
+    import jinja2
 
-def get_num_isos(filenames:list) -> int:
+
+def get_num_isos(filenames:list, registry:InputRegistry = None) -> int:
 
     """
     Calculates the number of unique identifiers (isos) from a list 
@@ -33,13 +36,17 @@ def get_num_isos(filenames:list) -> int:
 
     Args:
         filenames (list): A list of file paths to CSV files.
+        registry (InputRegistry): Files already read for the tables, 
+            whose first column values are used instead of reading the 
+            file again.
 
     Returns:
         int: The count of unique identifiers found across all valid files.
 
     Notes:
-        - The function uses `pd.read_csv` with `sep=None` and `engine='python'` 
-            to infer the delimiter automatically.
+        - Files that are not in the registry are read again: the delimiter 
+            is detected from the start of each file and only the first 
+            column is read.
         - Only files that exist and contain at least one row are processed.
         - The first column of each file is used to extract unique values.
     """
@@ -47,9 +54,11 @@ def get_num_isos(filenames:list) -> int:
     unique_isos = set()
     for filename in filenames:
         if 'version' not in filename:
-            if check_file_exists(filename):
+            if registry is not None and filename in registry:
+                unique_isos.update(registry[filename].ids)
+            elif check_file_exists(filename):
                 try:
-                    df = pd.read_csv(filename, sep=None, engine="python")
+                    df = read_table(filename, usecols=[0], dtype=str, engine="pyarrow")
                     # print(df)
                     if not df.empty:
                         for i in list(df.iloc[:, 0].unique()):
@@ -60,11 +69,11 @@ def get_num_isos(filenames:list) -> int:
         # print("UNIQUE ISOLATES: ", unique_isos)
     return len(unique_isos)
 
-def _make_menu(config: str, filenames: list, tree:str) -> list:
+def _make_menu(config, filenames: list, tree:str, registry:InputRegistry) -> list:
     
-    cfg = get_config(file_path = config)
+    cfg = load_config(config)
 
-    menu_dflt = cfg.get("menu", [])
+    menu_dflt = list(cfg.menu)
     
     
     if tree == "" and tree in menu_dflt:
@@ -73,13 +82,10 @@ def _make_menu(config: str, filenames: list, tree:str) -> list:
     
     # print(menu)
     tmp = []
+    # only files that were read into a table are in the menu
     for _file in filenames:
-        title = pathlib.Path(_file).stem.replace('_', ' ').replace('-', ' ')
-        try:
-            df = pd.read_csv(_file, sep='\t')
-            tmp.append(title)
-        except Exception as e:
-            print(f"Error reading file {_file}: {e}")
+        if _file in registry:
+            tmp.append(registry[_file].title)
     menu = []
     for m in menu_dflt:
         link = m.replace(' ', '-').replace('_', '-').lower()
@@ -117,6 +123,7 @@ def _make_pangenome_graph(
         dict: A dictionary containing the pangenome graph data.
     """
     if pangenome_rtab != "":
+        from datasmryzr.pangenome import do_pangenome_graph
         return do_pangenome_graph(
             pangenome_rtab = pangenome_rtab,
             pangenome_characterization = pangenome_characterization,
@@ -129,7 +136,10 @@ def make_density_plot(
     core_genome: str,
     reference: str,
     mask: str,
-    background_color: str
+    background_color: str,
+    window: int = 0,
+    strip_version: bool = True,
+    index_file: str = ""
 ):
     
     """
@@ -144,6 +154,12 @@ def make_density_plot(
         regions from the analysis.
         background_color (str): Color to use for the background 
         of the density plot.
+        window (int): Window size in bp used to pre-aggregate variant 
+        counts. If 0, counts are binned in the browser.
+        strip_version (bool): Ignore accession versions when matching 
+        contig names.
+        index_file (str): Path to a file to save the contigs of the 
+        reference in, for later runs.
     Returns:
         dict: A dictionary containing the SNP density plot data if 
         both `core_genome` and `reference` are provided. Returns an empty 
@@ -156,35 +172,55 @@ def make_density_plot(
         print(f"Reference genome file: {reference}")
         if mask != "":
             print(f"Mask file: {mask}")
+        from datasmryzr.core_genome import _plot_snpdensity
         return _plot_snpdensity(
             vcf_file = core_genome,
             reference = reference,
             mask_file = mask,
             bar_color = background_color,
+            window = window,
+            strip_version = strip_version,
+            index_file = index_file,
         )
     else:
         return {}
 def make_snp_heatmap(
-    distance_matrix:str
+    distance_matrix,
+    tree: str = "",
+    max_isolates: int = None,
+    tile: int = 0,
+    reduce: str = "max"
 ):
     """
     Function to make a SNP heatmap.
     Args:
-        distance_matrix (str): Path to the distance matrix file.
-        reference (str): Path to the reference genome file.
-        mask (str): Path to the mask file.
+        distance_matrix (str | DistanceMatrix): Path to the distance matrix 
+        file or the parsed distance matrix.
+        tree (str): Newick string of the tree, used to order isolates in 
+        large heatmaps.
+        max_isolates (int): Above this number of isolates the heatmap is 
+        drawn as an image (HEATMAP_MAX_ISOLATES if None).
+        tile (int): Number of isolates per tile in large heatmaps, 0 to 
+        choose automatically.
+        reduce (str): Show the "max" or "min" distance of each block of 
+        isolates in large heatmaps.
     Returns:
         dict: Dictionary containing the SNP heatmap data.
     """
     if distance_matrix != "" :
+        from datasmryzr.distances import _plot_heatmap, HEATMAP_MAX_ISOLATES
         return _plot_heatmap(
-            distances = distance_matrix
+            distances = distance_matrix,
+            tree = tree,
+            max_isolates = HEATMAP_MAX_ISOLATES if max_isolates is None else max_isolates,
+            tile = tile,
+            reduce = reduce
         )
     else:
         return {}
 
 def _make_summary_graph(
-        config: str = "",
+        config = "",
         bkg_color: str = "#343a40"
                     ) -> dict:
     """
@@ -196,25 +232,32 @@ def _make_summary_graph(
     # Placeholder for the summary graph data
     # This function can be expanded to include actual graph generation logic
     try:
+        # the graph libraries are only loaded if there is a summary file
+        summary_file = load_config(config).summary_graphs.get("summary_file", "")
+        if summary_file == "" or not check_file_exists(summary_file):
+            return {}
+        from datasmryzr.summary import summary_graphs
         return summary_graphs( config=config)
     except Exception as e:
         print(f"Error generating summary graph: {e}")
         return {}
 
 def make_snp_distances(
-    distance_matrix:str,
+    distance_matrix,
     bar_color:str = "lightblue",
 ):
     """
     Function to make SNP distances.
     Args:
-        distance_matrix (str): Path to the distance matrix file.
+        distance_matrix (str | DistanceMatrix): Path to the distance matrix 
+        file or the parsed distance matrix.
         reference (str): Path to the reference genome file.
         mask (str): Path to the mask file.
     Returns:
         dict: Dictionary containing the SNP distances data.
     """
     if distance_matrix != "":
+        from datasmryzr.distances import _plot_histogram
         return _plot_histogram(
             distances = distance_matrix,
             bar_color=bar_color
@@ -223,21 +266,120 @@ def make_snp_distances(
         return {}
 
 def make_cluster_stats(
-        distances:str,
+        distances,
         clusters:str,
+        max_points:int = None,
+        state_file:str = "",
         # bar_color:str = "lightblue",
 ):
     
     if distances != "" and clusters != "":
         print("Generating cluster statistics...")
+        from datasmryzr.clusters import get_cluster_graphs, CLUSTER_MAX_POINTS
         return get_cluster_graphs(
             distances = distances,
             clusters = clusters,
+            max_points = CLUSTER_MAX_POINTS if max_points is None else max_points,
+            state_file = state_file,
             # bar_color=bar_color
         )
     else:
         return {}
 
+def make_annotations(
+        path:str,
+        cols:str,
+        config,
+) -> dict:
+    """
+    Function to make the tree annotations.
+    Args:
+        path (str): Path to the annotation file.
+        cols (str): Columns of the annotation file to use.
+        config (str | Config): Path to the configuration file or the 
+        loaded configuration.
+    Returns:
+        dict: Dictionary containing the metadata tree, columns, colors 
+        and legend.
+    """
+    if path != "":
+        from datasmryzr.annotate import construct_annotations
+        return construct_annotations(path = path, cols = cols, config = config)
+    else:
+        return {
+            "metadata_tree": {},
+            "metadata_columns": [],
+            "colors_css": {},
+            "legend": [],
+        }
+
+def make_cluster_distances(
+        distances,
+        clusters:str,
+):
+    """
+    Function to get the distances within each cluster, for the cluster 
+    distance tables.
+    Args:
+        distances (str | DistanceMatrix): Path to the distance matrix 
+        file or the parsed distance matrix.
+        clusters (str): Path to the cluster table.
+    Returns:
+        dict: Dictionary containing the cluster distances.
+    """
+    if distances != "" and clusters != "":
+        from datasmryzr.clusters import get_cluster_distances
+        return get_cluster_distances(clusters, distances)
+    else:
+        return {}
+
+def _make_tables(
+        filenames:list,
+        config,
+        spool_dir:str = None,
+        registry:InputRegistry = None,
+        distances = "",
+) -> tuple:
+    """
+    Function to make the tables of the report, one for each file (files 
+    with the same name are combined into one table).
+    Args:
+        filenames (list): Paths to the files to make tables from.
+        config (str | Config): Path to the configuration file or the 
+        loaded configuration.
+        spool_dir (str): Directory to write the rows of the tables to.
+        registry (InputRegistry): Registry the files are recorded in as 
+        they are read.
+        distances (DistanceMatrix): The parsed distance matrix, whose 
+        table is made from the matrix rather than by reading the file again.
+    Returns:
+        tuple: The table, column and comment dictionaries and the registry 
+        of the files read.
+    """
+    table_dict = {}
+    col_dict = {}
+    comments = {}
+    registry = InputRegistry() if registry is None else registry
+    for _file in filenames:
+        print(f"Processing file {_file}...")
+        preloaded = None
+        if distances != "" and f"{_file}" == f"{distances.source}":
+            preloaded = (distances.iter_rows(), [distances.id_col] + list(distances.ids))
+        try:
+            table_dict, col_dict, comments = generate_table(
+                _file = _file, 
+                table_dict= table_dict, 
+                col_dict=col_dict,
+                comment_dict=comments, 
+                cfg_path = config,
+                spool_dir = spool_dir,
+                registry = registry,
+                preloaded = preloaded)
+            print(f"File {_file} processed.")
+        except Exception as e:
+            print(f"Error processing file {_file}: {e}")
+    return table_dict, col_dict, comments, registry
+
 def make_core_stats(
     core_genome_report:str,
     bar_color:str = "lightblue",
@@ -252,6 +394,7 @@ def make_core_stats(
         dict: Dictionary containing the SNP distances data.
     """
     if core_genome_report != "":
+        from datasmryzr.core_genome import _plot_stats
         return _plot_stats(
             core_genome_report= core_genome_report,
             bar_color=bar_color
@@ -259,20 +402,102 @@ def make_core_stats(
     else:
         return {}
 
-def _get_template(template:str) -> jinja2.Template:
+# templates shipped with datasmryzr, which custom templates can extend or include
+TEMPLATE_DIR = pathlib.Path(__file__).parent / "templates"
+
+
+@functools.lru_cache(maxsize = None)
+def _get_environment(template_dir:str) -> "jinja2.Environment":
     """
-    Function to get the template.
+    Function to get the jinja2 Environment for templates in a directory. 
+    Templates are looked up in the directory first and then in the 
+    datasmryzr templates (also available with the "datasmryzr/" prefix, 
+    e.g. `{% extends "datasmryzr/report.html.j2" %}`), so custom templates 
+    can reuse the report and its partials. Environments are kept for the 
+    rest of the run and compiled templates are cached on disk between runs.
+    Args:
+        template_dir (str): Directory of the template.
+    Returns:
+        jinja2.Environment: The environment.
+    """
+    import jinja2
+    base = jinja2.FileSystemLoader(TEMPLATE_DIR)
+    loader = jinja2.ChoiceLoader([
+        jinja2.FileSystemLoader(template_dir),
+        base,
+        jinja2.PrefixLoader({"datasmryzr": base}),
+    ])
+    try:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+    except (OSError, RuntimeError) as e:
+        print(f"Compiled templates will not be cached: {e}")
+        bytecode_cache = None
+    env = jinja2.Environment(loader = loader, bytecode_cache = bytecode_cache)
+    env.filters["json_chunks"] = iter_json
+    return env
+
+
+def _get_template(template:str) -> "jinja2.Template":
+    """
+    Function to get the template, compiled by a jinja2 Environment with 
+    the `json_chunks` filter, which writes large JSON objects to the 
+    report in chunks. Compiled templates are reused until the template 
+    file changes.
     Args:
         template (str): Path to the template file.
     Returns:
         jinja2.Template: Jinja2 template object.
     """
     if check_file_exists(template):
-        with open(template, "r", encoding="utf-8") as file:
-            return jinja2.Template(file.read())
+        path = pathlib.Path(template).resolve()
+        return _get_environment(f"{path.parent}").get_template(path.name)
     raise FileNotFoundError(f"Template file {template} not found.")
 
 
+def _table_sources(table_dict:dict, template:str) -> dict:
+    """
+    Function to get the spooled rows of each table. The report template 
+    copies them into the report in chunks, but custom templates may read 
+    the rows from `tables`, so for those the rows are loaded back into 
+    the table dictionary instead.
+    Args:
+        table_dict (dict): Tables by link, with the spool files of their 
+        rows ("sources").
+        template (str): Path to the template file.
+    Returns:
+        dict: Spool files by table link (empty for custom templates).
+    """
+    sources = {link: table_dict[link].pop('sources') for link in table_dict if 'sources' in table_dict[link]}
+    if pathlib.Path(template).resolve() == (TEMPLATE_DIR / "report.html.j2").resolve():
+        return sources
+    for link, files in sources.items():
+        for source in files:
+            table_dict[link]['tables'].extend(_load_json(source))
+    return {}
+
+
+def _write_report(template:"jinja2.Template", data:dict, target:pathlib.Path) -> None:
+    """
+    Function to render the report straight to disk. The template is 
+    rendered as a stream to a temporary file next to the target, which 
+    is then renamed to the target, so a failed run does not leave a 
+    partial report.
+    Args:
+        template (jinja2.Template): The report template.
+        data (dict): Data to render the template with.
+        target (pathlib.Path): Path of the report.
+    """
+    target = pathlib.Path(target)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as out:
+            template.stream(data).dump(out)
+        os.replace(tmp, target)
+    except BaseException:
+        tmp.unlink(missing_ok = True)
+        raise
+
+
 def _get_target(outpath:str, title:str) -> str:
     
     """
@@ -311,6 +536,26 @@ def _parse_genome_file_name(filename:str) -> str:
     return pathlib.Path(filename).stem.replace("_","-").replace(" ","-").lower()
 
 
+def _build_sections(sections:dict, jobs:int = 1) -> dict:
+    """
+    Function to build the sections of the report. Sections do not depend 
+    on each other, so with more than one job they are built at the same 
+    time in a pool of processes.
+    Args:
+        sections (dict): The function to build each section and its 
+        inputs (keyword arguments), by section name.
+        jobs (int): Number of processes to use.
+    Returns:
+        dict: The result of each section, by section name.
+    """
+    if jobs <= 1:
+        return {name: func(**kwargs) for name, (func, kwargs) in sections.items()}
+    from concurrent.futures import ProcessPoolExecutor
+    print(f"Building {len(sections)} sections with {jobs} processes...")
+    with ProcessPoolExecutor(max_workers = min(jobs, len(sections))) as pool:
+        futures = {name: pool.submit(func, **kwargs) for name, (func, kwargs) in sections.items()}
+        return {name: future.result() for name, future in futures.items()}
+
 
 def smryz(
         output: str, 
@@ -338,7 +583,16 @@ def smryz(
         pangenome_groups: str = "",
         pipeline: str = "not provided",
         pipeline_version: str = "not provided",
-        no_downloadable_tables: bool = False
+        no_downloadable_tables: bool = False,
+        snp_window: int = 0,
+        keep_accession_version: bool = False,
+        heatmap_max_isolates: int = None,
+        heatmap_tile: int = 0,
+        heatmap_reduce: str = "max",
+        cluster_max_points: int = None,
+        cluster_state: str = "",
+        reference_index: str = "",
+        jobs: int = 1
 ) -> None:
     
     """
@@ -361,6 +615,25 @@ def smryz(
     background_color (str): Background color for the report.
     font_color (str): Font color for the report.
     config (str): Path to the configuration file.
+    snp_window (int): Window size in bp for pre-aggregating the SNP 
+    density plot, 0 to bin in the browser.
+    keep_accession_version (bool): Match contig names including their 
+    accession version for the SNP density plot.
+    heatmap_max_isolates (int): Above this number of isolates the heatmap 
+    is drawn as an image (HEATMAP_MAX_ISOLATES if None).
+    heatmap_tile (int): Number of isolates per tile in large heatmaps, 0 to 
+    choose automatically.
+    heatmap_reduce (str): Show the "max" or "min" distance of each block of 
+    isolates in large heatmaps.
+    cluster_max_points (int): Maximum number of pairs shown as points in 
+    each cluster distance graph, above which boxplots are drawn from 
+    summary statistics (CLUSTER_MAX_POINTS if None).
+    cluster_state (str): Path to a file used to save the cluster 
+    statistics, so that the next run only recomputes changed clusters.
+    reference_index (str): Path to a file used to save the contigs of the 
+    reference, so that the next run does not rescan an unchanged reference.
+    jobs (int): Number of processes used to build the sections of the 
+    report.
     Returns:
     None
     """
@@ -369,10 +642,9 @@ def smryz(
     print(f"Output will be saved to {output}")
     print(f"Using template {template}")
     print(f"Using configuration file {config}")
+    # the configuration is read and checked once and shared by every section
+    config = load_config(config)
     tree_string = _get_tree_string(tree) 
-    table_dict = {}
-    col_dict = {}
-    comments = {}
     
     filenames = [ i for i in filename if check_file_exists(i) ]
     print("Initial filenames: ", filenames)
@@ -380,43 +652,100 @@ def smryz(
         filenames.append(distance_matrix)
     if core_genome_report != "":
         filenames.append(core_genome_report)
+    # the distance matrix is parsed once and shared by every section
+    distances = ""
+    if distance_matrix != "":
+        from datasmryzr.distances import _load_distances
+        distances = _load_distances(distance_matrix)
     if cluster_table != "" and distance_matrix != "":
         print("Getting cluster distances...")
-        filenames.append(get_cluster_table(cluster_table, distance_matrix))
+        from datasmryzr.clusters import get_cluster_table
+        filenames.append(get_cluster_table(cluster_table, distances))
         # filenames.remove(cluster_table)
         # print(cluster_table)
         filenames = [filename for filename in filenames if filename != cluster_table]
     print("Filenames to be processed: ", filenames)
     print(pangenome_groups)
     if pangenome_rtab != "":
+        from datasmryzr.pangenome import _pangenome_summary
         pangenome_summary = _pangenome_summary(
             pangenome_rtab = pangenome_rtab,
             pangenome_characterization = pangenome_characterization,
             groups = pangenome_groups
         )
         filenames.append(f"{pathlib.Path.cwd() / pangenome_summary}")
-    menu = _make_menu(config, filenames, tree)
-    for _file in filenames:
-        print(f"Processing file {_file}...")
-        try:
-            table_dict, col_dict, comments = generate_table(
-                _file = _file, 
-                table_dict= table_dict, 
-                col_dict=col_dict,
-                comment_dict=comments, 
-                cfg_path = config)
-            print(f"File {_file} processed.")
-        except Exception as e:
-            print(f"Error processing file {_file}: {e}")
-    
-    metadata_dict = construct_annotations(
-        path = annotate,
-        cols = annotate_cols,
-        config=config
-    )
+    # table rows are written to json files and copied into the report when it is written
+    spool = tempfile.TemporaryDirectory(prefix = "datasmryzr_")
+    if jobs > 1 and distances != "":
+        # worker processes map the distances from file instead of copying them
+        distances = distances.share(spool.name)
+    # each section of the report and its inputs - sections are independent 
+    # of each other and can be built in parallel
+    sections = {
+        "tables": (_make_tables, dict(
+            filenames = filenames,
+            config = config,
+            spool_dir = spool.name,
+            distances = distances
+        )),
+        "metadata": (make_annotations, dict(
+            path = annotate,
+            cols = annotate_cols,
+            config = config
+        )),
+        "distdict": (make_cluster_distances, dict(
+            distances = distances,
+            clusters = cluster_table
+        )),
+        "snp_distances": (make_snp_distances, dict(
+            distance_matrix = distances,
+            bar_color = background_color
+        )),
+        "snp_heatmap": (make_snp_heatmap, dict(
+            distance_matrix = distances,
+            tree = tree_string,
+            max_isolates = heatmap_max_isolates,
+            tile = heatmap_tile,
+            reduce = heatmap_reduce
+        )),
+        "snp_density": (make_density_plot, dict(
+            core_genome = core_genome,
+            reference = reference,
+            mask = mask,
+            background_color = background_color,
+            window = snp_window,
+            strip_version = not keep_accession_version,
+            index_file = reference_index,
+        )),
+        "pangenome": (_make_pangenome_graph, dict(
+            pangenome_rtab = pangenome_rtab,
+            pangenome_characterization = pangenome_characterization,
+            pangenome_groups = pangenome_groups
+        )),
+        "summary_graph": (_make_summary_graph, dict(
+            config = config,
+            bkg_color = background_color
+        )),
+        "core_stats": (make_core_stats, dict(
+            core_genome_report = core_genome_report,
+            bar_color = background_color
+        )),
+        "cluster_stats": (make_cluster_stats, dict(
+            distances = distances,
+            clusters = cluster_table,
+            max_points = cluster_max_points,
+            state_file = cluster_state,
+        )),
+    }
+    sections = _build_sections(sections, jobs = jobs)
+    # each input file is read once, for its table, and the menu and isolate 
+    # count are made from what was recorded while it was read
+    table_dict, col_dict, comments, registry = sections["tables"]
+    menu = _make_menu(config, filenames, tree, registry)
+    metadata_dict = sections["metadata"]
     data = {
         "title": title,
-        "num_isos": get_num_isos(filename),
+        "num_isos": get_num_isos(filename, registry),
         "description": description,
         "background_color": background_color,
         "font_color": font_color,
@@ -425,44 +754,22 @@ def smryz(
         "phylo": "phylo" if tree != "" else "no_phylo",
         "menu":menu,
         "tables": table_dict,
+        "table_sources": _table_sources(table_dict, template),
+        "read_spool": read_spool,
         "columns": col_dict,
         "comment": comments,
-        "distdict": get_cluster_distances(cluster_table, distance_matrix) if cluster_table != "" and distance_matrix != "" else {},
+        "distdict": sections["distdict"],
         "numvarsites": f"{numvarsites} variant sites used for tree construction" if numvarsites > 0 else "Number of variant sites not provided",
         "treebuilder":treebuilder,
         "newick": tree_string,
         "core_genome": _parse_genome_file_name(core_genome_report),
-        "snp_distances": make_snp_distances(
-        distance_matrix = distance_matrix,
-        bar_color = background_color
-    ) ,
-        "snp_heatmap": make_snp_heatmap(
-        distance_matrix = distance_matrix
-    ),
-        "snp_density": make_density_plot(
-        core_genome = core_genome,
-        reference = reference,
-        mask = mask,
-        background_color = background_color,
-    ),
-        "pangenome": _make_pangenome_graph(
-            pangenome_rtab = pangenome_rtab,
-            pangenome_characterization = pangenome_characterization,
-            pangenome_groups = pangenome_groups
-        ),
-        "summary_graph" : _make_summary_graph(
-            config=config,
-            bkg_color=background_color
-            ),
-        "core_stats": make_core_stats(
-            core_genome_report = core_genome_report,
-            bar_color = background_color
-        ),
-        "cluster_stats": make_cluster_stats(
-            distances = distance_matrix,
-            clusters = cluster_table,
-            # bar_color = background_color
-        ),
+        "snp_distances": sections["snp_distances"],
+        "snp_heatmap": sections["snp_heatmap"],
+        "snp_density": sections["snp_density"],
+        "pangenome": sections["pangenome"],
+        "summary_graph" : sections["summary_graph"],
+        "core_stats": sections["core_stats"],
+        "cluster_stats": sections["cluster_stats"],
         "annotate": annotate,
         "pipeline_name": pipeline,
         "pipeline_version": pipeline_version,
@@ -482,4 +789,5 @@ def smryz(
     target = _get_target(output, title)
     print(data["title"])
     print("Rendering template...")
-    target.write_text(template.render(data))
\ No newline at end of file
+    _write_report(template, data, target)
+    spool.cleanup()
\ No newline at end of file
@@ -5,11 +5,10 @@ for pangenome analysis.
 
 import altair as alt
 import pandas as pd
-from Bio import SeqIO
 import pathlib
 import gzip
 import csv
-from datasmryzr.utils import check_file_exists, _open_df, get_config
+from datasmryzr.utils import check_file_exists, _open_df, load_config
 
 alt.data_transformers.disable_max_rows()
 
@@ -94,15 +93,16 @@ def summary_graphs(config:str, bkg_color:str = "#343a40")-> dict:
     Generates summary graphs for pangenome data.
 
     Args:
-        config (str): Path to the configuration file.
+        config (str | Config): Path to the configuration file or the 
+        loaded configuration.
 
     Returns:
         dict: Dictionary containing the summary graphs.
     """
-    config = get_config(config)
-    _path = pathlib.Path(config["summary_graphs"]["summary_file"])
-    facets = config["summary_graphs"]["facets"]
-    vals = config["summary_graphs"]["vals"]
+    config = load_config(config)
+    _path = pathlib.Path(config.summary_graphs["summary_file"])
+    facets = config.summary_graphs["facets"]
+    vals = config.summary_graphs["vals"]
 
     df = _get_dataframe(_path)
 
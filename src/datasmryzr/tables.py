@@ -5,15 +5,24 @@ checking numeric columns, and generating dictionaries with metadata.
 
 import json
 import csv
-import ast
 import pathlib
-from datasmryzr.utils import check_file_exists, get_config
+from datasmryzr.utils import (
+    check_file_exists,
+    load_config,
+    sniff_delimiter,
+    infer_column_types,
+    update_column_types,
+)
+from datasmryzr.inputs import InputRegistry
+
+# number of rows serialised at a time when a table is written to JSON
+SPOOL_CHUNK_ROWS = 1000
 
 
 
 def _get_delimiter(file:str) -> str:
     """
-    Function to get the delimiter of a file.
+    Function to get the delimiter of a file, from the first few KB only.
     Args:
         file (str): Path to the file.
     Returns:
@@ -23,119 +32,247 @@ def _get_delimiter(file:str) -> str:
     """
     if "json" in file:
         return "json"
-    with open(file, "r", encoding="utf-8") as f:
-        line = f.read()
-        if "\t" in line:
-            return "\t"
-        if "," in line:
-            return ","
-    raise ValueError(f"Could not determine the delimiter for file: {file}")
+    return sniff_delimiter(file)
+
+def _load_json(_file:str):
+    """
+    Function to parse a JSON file, with orjson if it is installed.
+    Args:
+        _file (str): Path to the file.
+    Returns:
+        The parsed JSON data.
+    """
+    try:
+        import orjson
+    except ImportError:
+        with open(_file, 'r') as f:
+            return json.load(f)
+    with open(_file, 'rb') as f:
+        return orjson.loads(f.read())
+
+def _iter_json_rows(data:list):
+    """
+    Function to iterate over the rows of nested JSON data at any depth, 
+    each row followed by its `_children`.
+    Args:
+        data (list): Rows of nested JSON data.
+    Yields:
+        dict: Rows of the data.
+    """
+    stack = list(reversed(data))
+    while stack:
+        row = stack.pop()
+        yield row
+        stack.extend(reversed(row.get("_children") or []))
 
 def _get_json_data(_file:str,
                    id_col:None) -> dict:
     """
-    Function to read a JSON file and return its content as a dictionary.
+    Function to read a JSON file and return its content and columns. 
+    Columns are collected from the rows at every level of `_children`, 
+    in the order they are found.
     Args:
         file (str): Path to the file.
+        id_col (str): The ID column, placed first if present.
     Returns:
-        dict: Dictionary representing the content of the JSON file.
+        tuple: List of rows in the JSON file and the list of columns.
+    Raises:
+        ValueError: If the file is not a list of rows.
     """
-
-    with open(_file, 'r') as f:
-        json_str = f.read()
-        data = ast.literal_eval(json_str)
-        # tmp_data = data[0]
-        print(data)
-        columns = set()
-        for row in data:
-            print(row)
-            if "_children" in row:
-                # print("Children found")
-                for child in row["_children"]:
-                    for key in child.keys():
-                        if key != "_children":
-                            columns.add(key)
-            
-        # else:
-        if id_col:
-            columns = sorted(columns,key=lambda x: [id_col].index(x) if x in [id_col] else 10e99)
-    
-        #     raise ValueError(f"Invalid JSON format in file: {_file}")
+    print(f"Reading JSON data from file: {_file}")
+    data = _load_json(_file)
+    if not isinstance(data, list):
+        raise ValueError(f"Invalid JSON format in file: {_file}")
+    columns = {}
+    for row in _iter_json_rows(data):
+        columns.update(dict.fromkeys(row))
+    columns = [col for col in columns if col != "_children"]
+    if id_col in columns:
+        columns.remove(id_col)
+        columns.insert(0, id_col)
     return data,columns
 
 def get_width(_file:str) -> int:
     pass
 
-def _get_tabular_data(_file:str, dlm:str) -> list:
+def _iter_tabular_data(_file:str, dlm:str) -> tuple:
     """
-    Function to read a tabular file and return its content as a list of dictionaries.
+    Function to read a tabular file one row at a time.
     Args:
         file (str): Path to the file.
         dlm (str): Delimiter used in the file.
     Returns:
-        list: List of dictionaries representing the rows in the file.
+        tuple: Generator of dictionaries representing the rows in the 
+        file and the list of columns.
     """
     print(f"Reading tabular data from file: {_file} with delimiter: {dlm}")
     with open(_file, 'r') as f:
-        reader = csv.DictReader(f, delimiter = dlm)
-        data = [row for row in reader]
-        columns = list(reader.fieldnames)
-        # print(data)
-    return data,columns
+        columns = list(csv.DictReader(f, delimiter = dlm).fieldnames or [])
+    def rows():
+        # the file is only opened once the rows are read, and is closed 
+        # even if they are not all read
+        with open(_file, 'r') as f:
+            yield from csv.DictReader(f, delimiter = dlm)
+    return rows(), columns
 
-def _decide_type(val:str,
-                 is_numeric:set) -> str:
+def _html_safe(text:str) -> str:
     """
-    Function to determine the type of a value.
+    Function to escape JSON text so that it is safe to embed in a html 
+    script (as jinja's tojson filter).
     Args:
-        val (str): The value to be checked.
+        text (str): JSON text.
     Returns:
-        str: The type of the value ("number" or "input").
+        str: The escaped JSON text.
     """
-    try:
-        float(val)
-        is_numeric.add(True)
-    except ValueError:
-        is_numeric.add(False)
-    return is_numeric
-
-def _check_numeric(col:str, 
-                   data:list,
-                   is_json:bool = False) -> bool:
-    
+    return (text.replace("<", "\\u003c")
+                .replace(">", "\\u003e")
+                .replace("&", "\\u0026")
+                .replace("'", "\\u0027"))
+
+def _json_chunk(rows:list) -> str:
     """
-    Determines if all values in a specified column of a dataset can be
-    converted to numeric.
+    Function to serialise rows of a table as JSON that is safe to embed in 
+    a html script (as jinja's tojson filter).
     Args:
-        col (str): The name of the column to check.
-        data (list): A list of dictionaries representing the dataset, 
-        where each dictionary 
-                        corresponds to a row and contains column-value pairs.
+        rows (list): Rows of the table.
     Returns:
-        bool: Returns "number" if all values in the specified column can 
-        be converted to numeric, otherwise returns "input".
+        str: Comma separated JSON objects.
     """
-    
-    is_numeric = set()
+    return _html_safe(",".join(json.dumps(row, sort_keys = True) for row in rows))
+
+def iter_json(obj, chunk_items:int = SPOOL_CHUNK_ROWS):
+    """
+    Function to serialise an object as JSON in chunks, so that large 
+    objects can be written to the report without building the whole JSON 
+    string. Dictionaries are written one key at a time and long lists 
+    `chunk_items` items at a time. The output is the same as jinja's 
+    tojson filter.
+    Args:
+        obj: The object to serialise.
+        chunk_items (int): Number of list items serialised at a time.
+    Yields:
+        str: Chunks of html safe JSON.
+    """
+    if isinstance(obj, dict):
+        yield "{"
+        for n, (key, val) in enumerate(sorted(obj.items())):
+            # json.dumps converts non string keys, e.g. {1: null} -> {"1": null}
+            key = json.dumps({key: None})[1:-len(": null}")]
+            yield _html_safe(f"{', ' if n else ''}{key}: ")
+            yield from iter_json(val, chunk_items = chunk_items)
+        yield "}"
+    elif isinstance(obj, (list, tuple)) and len(obj) > chunk_items:
+        yield "["
+        for start in range(0, len(obj), chunk_items):
+            text = json.dumps(list(obj[start:start + chunk_items]), sort_keys = True)[1:-1]
+            yield _html_safe(f"{', ' if start else ''}{text}")
+        yield "]"
+    else:
+        yield _html_safe(json.dumps(obj, sort_keys = True))
+
+def _write_rows(rows, path:str) -> int:
+    """
+    Function to write the rows of a table to a JSON array file, 
+    SPOOL_CHUNK_ROWS rows at a time.
+    Args:
+        rows (iterable): Rows of the table.
+        path (str): Path of the JSON file.
+    Returns:
+        int: Number of rows written.
+    """
+    count = 0
+    chunk = []
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == SPOOL_CHUNK_ROWS:
+                out.write(("," if count else "") + _json_chunk(chunk))
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            out.write(("," if count else "") + _json_chunk(chunk))
+            count += len(chunk)
+        out.write("]")
+    return count
+
+def read_spool(path:str, chunk_size:int = 65536):
+    """
+    Function to read a spooled table in chunks, so the report can be 
+    written without holding the table in memory.
+    Args:
+        path (str): Path of the JSON file written by generate_table.
+        chunk_size (int): Number of characters read at a time.
+    Yields:
+        str: Chunks of the JSON array.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def _iter_table_rows(data, 
+                     columns:list, 
+                     id_col:str = None, 
+                     is_json:bool = False,
+                     numeric:dict = None,
+                     sample:int = None):
+    """
+    Function to convert rows of data to the rows of the Tabulator table. 
+    Tabular rows are also checked for numeric values as they are 
+    converted (the first `sample` rows only, if given).
+    Args:
+        data (iterable): Rows of data.
+        columns (list): Columns of the table.
+        id_col (str): The ID column (JSON data only).
+        is_json (bool): Whether the rows are nested JSON rows.
+        numeric (dict): Columns still to be checked for numeric values, 
+        updated to False when a non-numeric value is found.
+        sample (int): Maximum number of rows to check (all rows if None).
+    Yields:
+        dict: Rows of the table.
+    """
+    numeric = {} if numeric is None else numeric
+    _id = 1
     for row in data:
+        _sample_dict = {"id":_id}
+        
         if not is_json:
-            val = row[col] 
-            is_numeric = _decide_type(val, is_numeric)
+            for col in columns:
+                _sample_dict[col] = f"{row[col]}" 
+            if not sample or _id <= sample:
+                update_column_types(row, numeric)
         else:
-            for sub in row["_children"]:
-                # print(sub[col])
-                val = sub[col]
-                is_numeric = _decide_type(val, is_numeric)
-                    
-    return "number" if len(is_numeric)==1 and True in is_numeric else "input"
-
-
+            if id_col:
+                _sample_dict[id_col] = f"{row[id_col]}" if id_col in row else None
+            for col in columns:
+                _sample_dict[col] = f"{row[col]}" if col in row else ""
+            _sample_dict["_children"] = []
+            stack = [(sub, _sample_dict["_children"]) for sub in reversed(row.get("_children") or [])]
+            while stack:
+                sub, parent = stack.pop()
+                _id = _id + 1
+                _sub_sample_dict = {"id":_id}
+                for col in columns:
+                    _sub_sample_dict[col] = f"{sub[col]}" if col in sub else ""
+                parent.append(_sub_sample_dict)
+                if sub.get("_children"):
+                    _sub_sample_dict["_children"] = []
+                    stack.extend((child, _sub_sample_dict["_children"]) for child in reversed(sub["_children"]))
+                
+        _id = _id + 1
+        yield _sample_dict
 
 def generate_table(_file :str, 
                    table_dict:dict, 
                    col_dict:dict,
                    comment_dict:dict, 
-                   cfg_path:str) -> dict:
+                   cfg_path:str,
+                   spool_dir:str = None,
+                   registry:InputRegistry = None,
+                   preloaded:tuple = None) -> dict:
     """
     Generates a table representation from a given file and updates the provided 
     dictionaries with table, column, and comment information.
@@ -147,35 +284,50 @@ def generate_table(_file :str,
         If empty, it will be initialized.
         comment_dict (dict): A dictionary to store comments associated with the table. 
         If empty, it will be initialized.
-        cfg_path (str): The path to the configuration file containing metadata
-        such as comments and data types.
+        cfg_path (str | Config): The path to the configuration file containing 
+        metadata such as comments and data types, or the loaded configuration.
+        spool_dir (str): Directory to write the rows of the table to (as a 
+        JSON array, listed in `table_dict[link]['sources']`) instead of 
+        keeping them in `table_dict[link]['tables']`. Tabular files are 
+        then streamed from the file to the JSON without being held in memory.
+        registry (InputRegistry): Registry in which the file (delimiter, 
+        columns, number of rows and IDs) is recorded as it is read.
+        preloaded (tuple): Rows (dictionaries of text values) and columns 
+        of a tabular file that has already been parsed (e.g. the shared 
+        distance matrix), used instead of reading the file again.
     Returns:
         tuple: A tuple containing the updated 
         `table_dict`, `col_dict`, and `comment_dict`.
     Raises:
         FileNotFoundError: If the input file does not exist.
-        KeyError: If required keys are missing in the configuration file.
+        ValueError: If the configuration file is not valid.
     """
     is_json = False
-    cfg = get_config(cfg_path)
-    # print(cfg)
+    cfg = load_config(cfg_path)
     dlm = _get_delimiter(_file)
     
-    id_col = cfg["id_column"] if "id_column" in cfg else None
+    id_col = cfg.id_column
     # print(f"ID col:{id_col}")
     if not check_file_exists(_file):
         raise FileNotFoundError(f"Input file {_file} does not exist.")
     # print(dlm)
-    if dlm != "json" and dlm is not None:
-        data, columns = _get_tabular_data(_file, dlm)
+    if preloaded is not None and dlm != "json":
+        data, columns = preloaded
+    elif dlm != "json" and dlm is not None:
+        data, columns = _iter_tabular_data(_file, dlm)
     elif dlm == "json":
         data,columns = _get_json_data(_file, id_col=id_col)
         is_json = True
+    if registry is not None:
+        data = registry.track(_file, dlm, columns, data)
+        if is_json:
+            # JSON rows are already in memory and are read twice below
+            data = list(data)
 
         
     title = pathlib.Path(_file).stem.replace('_', ' ').replace('-', ' ')
     link = pathlib.Path(_file).stem.replace(' ', '-').replace('_', '-').lower()
-    comment = cfg["comments"].get(link, "")
+    comment = cfg.comments.get(link, "")
     # print(comment)
     comment = "<br>".join(comment) if isinstance(comment, list) else comment
     # print(comment)
@@ -184,15 +336,35 @@ def generate_table(_file :str,
     if link not in table_dict:
         print(f"Creating table for {title}")
         table_dict[link] = {"link": link, "name": title, "tables": []}
+    table_dict[link]['has_graph'] = 'true' if link in cfg.has_graph else 'false'
     
     if link not in col_dict:
         col_dict[link] = []
     
     # try:
     if dlm:
+        # tabular files are checked for numeric columns while the rows are read
+        sample = cfg.type_sample_rows
+        numeric = {} if is_json else {col: True for col in columns if col != "_children"}
+        rows = _iter_table_rows(data, columns, id_col = id_col, is_json = is_json, numeric = numeric, sample = sample)
+        if spool_dir is not None:
+            path = pathlib.Path(spool_dir) / f"{link}-{len(table_dict[link].get('sources', []))}.json"
+            count = _write_rows(rows, str(path))
+            table_dict[link].setdefault('sources', []).append(str(path))
+        else:
+            count = len(table_dict[link]['tables'])
+            table_dict[link]['tables'].extend(rows)
+            count = len(table_dict[link]['tables']) - count
+        if is_json:
+            types = infer_column_types(
+                _iter_json_rows(data), 
+                [col for col in columns if col != "_children"], 
+                sample = sample)
+        else:
+            types = {col: "number" if is_num and count > 0 else "input" for col, is_num in numeric.items()}
         for col in columns:
             if col != "_children":
-                _type = cfg["datatype"].get(col, _check_numeric(col=col, data=data, is_json=is_json))
+                _type = cfg.datatype.get(col, types[col])
                 width = max(len(col) * 10, 120)
                 d ={
                     'title':col,
@@ -214,32 +386,6 @@ def generate_table(_file :str,
                                             "color":["#ed671f","#3a9c4a"],
                                         }
                 col_dict[link].append(d)
-        _id =1
-        for row in data:
-            _sample_dict = {"id":_id}
-            
-            if not is_json:
-                for col in columns:
-                    _sample_dict[col] = f"{row[col]}" 
-            else:
-                if id_col:
-                    _sample_dict[id_col] = f"{row[id_col]}" if id_col in row else None
-                for col in columns:
-                    _sample_dict[col] = f"{row[col]}" if col in row else ""
-                _sample_dict["_children"] = []
-                for sub in row["_children"]:
-                    _id = _id + 1
-                    _sub_sample_dict = {"id":_id}
-                    for col in columns:
-                        _sub_sample_dict[col] = f"{sub[col]}"
-                    _sample_dict["_children"].append(_sub_sample_dict)
-                    
-            _id = _id + 1
-            table_dict[link]['tables'].append(_sample_dict)
-            table_dict[link]['has_graph'] = 'true' if link in cfg["has_graph"] and "has_graph" in cfg else 'false'
-                # for i in table_dict[link]['tables']:
-                #     if 'plasmid' in i:
-                #         print(i)
     # except Exception as e:
     #     print(f"An error has occured reading {_file}: {e}")
     return table_dict,col_dict,comment_dict
\ No newline at end of file
@@ -1,6 +1,18 @@
 import pathlib
 import json
-import pandas as pd
+import csv
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# number of bytes read from the start of a file to detect its delimiter
+SNIFF_BYTES = 4096
+DELIMITERS = "\t,;|"
+# delimiter of files with a single column
+DEFAULT_DELIMITER = "\t"
+# read_csv options the pyarrow engine does not support
+_PYARROW_UNSUPPORTED = {"chunksize", "iterator", "nrows", "skipfooter", "converters"}
 
 def check_file_exists(file_path: str) -> bool:
     """
@@ -29,7 +41,221 @@ def get_config(file_path: str) -> dict:
         config = json.load(_file)
     return config
 
-def _open_df(file_path: str) -> pd.DataFrame:
+
+class Config:
+    """
+    Report configuration. The configuration file is read and validated
+    once and the same object is passed to every part of the report, with
+    sets for the lookups made for each table and column.
+    Attributes:
+        comments (dict): Comments for each table, by table link.
+        datatype (dict): Column types (table header filters), by column.
+        categorical_columns (frozenset): Columns treated as categorical
+        for tree annotation.
+        has_graph (frozenset): Tables (by link) that have a graph.
+        menu (tuple): Tables listed first in the menu.
+        id_column (str): The ID column of nested (JSON) tables.
+        default_table (str): The table shown first.
+        summary_graphs (dict): Settings of the summary graph.
+        type_sample_rows (int): Number of rows used to infer column types
+        (all rows if None).
+        source (str): Path of the configuration file, if read from file.
+    """
+
+    # expected type of each setting in the configuration file
+    FIELDS = {
+        "comments": dict,
+        "datatype": dict,
+        "categorical_columns": list,
+        "has_graph": list,
+        "menu": list,
+        "id_column": str,
+        "default_table": str,
+        "summary_graphs": dict,
+        "type_sample_rows": int,
+    }
+
+    def __init__(self,
+                 comments:dict = None,
+                 datatype:dict = None,
+                 categorical_columns:list = (),
+                 has_graph:list = (),
+                 menu:list = (),
+                 id_column:str = None,
+                 default_table:str = "",
+                 summary_graphs:dict = None,
+                 type_sample_rows:int = None,
+                 source:str = ""):
+        self.comments = dict(comments or {})
+        self.datatype = dict(datatype or {})
+        self.categorical_columns = frozenset(categorical_columns)
+        self.has_graph = frozenset(has_graph)
+        self.menu = tuple(menu)
+        self.id_column = id_column
+        self.default_table = default_table
+        self.summary_graphs = dict(summary_graphs or {})
+        self.type_sample_rows = type_sample_rows
+        self.source = source
+
+    @classmethod
+    def from_dict(cls, config:dict, source:str = "") -> "Config":
+        """
+        Function to create a configuration from a dictionary, checking the
+        type of each setting.
+        Args:
+            config (dict): Configuration data.
+            source (str): Path of the configuration file.
+        Returns:
+            Config: The validated configuration.
+        Raises:
+            ValueError: If the configuration is not valid.
+        """
+        name = source or "configuration"
+        if not isinstance(config, dict):
+            raise ValueError(f"Invalid configuration in {name}: expected a JSON object.")
+        settings = {}
+        for key, _type in cls.FIELDS.items():
+            val = config.get(key)
+            if val is None or (key == "id_column" and val == ""):
+                continue
+            if not isinstance(val, _type) or isinstance(val, bool):
+                raise ValueError(
+                    f"Invalid configuration in {name}: '{key}' should be of type {_type.__name__}."
+                )
+            settings[key] = val
+        for key in ("categorical_columns", "has_graph", "menu"):
+            if not all(isinstance(val, str) for val in settings.get(key, [])):
+                raise ValueError(
+                    f"Invalid configuration in {name}: '{key}' should be a list of column or table names."
+                )
+        if not all(isinstance(val, str) for val in settings.get("datatype", {}).values()):
+            raise ValueError(
+                f"Invalid configuration in {name}: 'datatype' values should be strings."
+            )
+        if settings.get("type_sample_rows", 1) < 1:
+            raise ValueError(
+                f"Invalid configuration in {name}: 'type_sample_rows' should be at least 1."
+            )
+        return cls(**settings, source = source)
+
+    @classmethod
+    def from_file(cls, file_path:str) -> "Config":
+        """
+        Function to read and validate a configuration file.
+        Args:
+            file_path (str): Path to the configuration file.
+        Returns:
+            Config: The validated configuration.
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If the file is not a valid configuration.
+        """
+        if not check_file_exists(file_path):
+            raise FileNotFoundError(f"Configuration file {file_path} does not exist.")
+        try:
+            config = get_config(file_path)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid configuration in {file_path}: {e}")
+        return cls.from_dict(config, source = file_path)
+
+
+def load_config(config) -> Config:
+    """
+    Function to get the report configuration, reading it from file if a
+    path is given.
+    Args:
+        config (str | Config): Path to the configuration file or an
+        already loaded configuration.
+    Returns:
+        Config: The configuration.
+    """
+    if isinstance(config, Config):
+        return config
+    return Config.from_file(config)
+
+def sniff_delimiter(file_path: str, sample_size: int = SNIFF_BYTES) -> str:
+    """
+    Detect the delimiter of a tabular file from its first few KB. Files 
+    with a single column use the default delimiter.
+
+    Args:
+        file_path (str): Path to the file.
+        sample_size (int): Number of bytes to read.
+
+    Returns:
+        str: Delimiter used in the file.
+
+    Raises:
+        ValueError: If the delimiter cannot be determined.
+    """
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        sample = f.read(sample_size)
+    # only sniff complete lines
+    if len(sample) == sample_size and "\n" in sample:
+        sample = sample[:sample.rindex("\n")]
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        # fall back to the most common delimiter in the header
+        header = sample.splitlines()[0] if sample else ""
+        counts = {d: header.count(d) for d in DELIMITERS}
+        delimiter = max(counts, key=counts.get)
+        if counts[delimiter] > 0:
+            return delimiter
+        # a header of one column name, rather than one split on an 
+        # unsupported delimiter (e.g. spaces)
+        if len(header.split()) == 1:
+            return DEFAULT_DELIMITER
+    raise ValueError(f"Unknown delimiter for file: {file_path}")
+
+
+def _csv_engine(engine: str, kwargs: dict) -> str:
+    """
+    Check the pandas parser requested for the given options. The pyarrow 
+    parser infers types differently to the C parser (e.g. leading zeros 
+    and dates), so it is only used when asked for.
+
+    Args:
+        engine (str): Requested parser ("c" or "pyarrow").
+        kwargs (dict): Options passed to pd.read_csv.
+
+    Returns:
+        str: "pyarrow" if it was requested, is installed and supports the 
+        options, otherwise "c".
+    """
+    if engine != "pyarrow" or _PYARROW_UNSUPPORTED.intersection(kwargs):
+        return "c"
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "c"
+    return "pyarrow"
+
+
+def read_table(file_path: str, sep: str = None, engine: str = "c", **kwargs) -> "pd.DataFrame":
+    """
+    Read a delimited file into a DataFrame. The delimiter is detected from 
+    the start of the file (unless given) so that the C or pyarrow parser 
+    can be used instead of the python parser.
+
+    Args:
+        file_path (str): Path to the file (or an open file if sep is given).
+        sep (str): Delimiter, detected from the file if None.
+        engine (str): Parser to use. "pyarrow" is used only if it is 
+        installed and supports the options (e.g. not with chunksize).
+        **kwargs: Other options passed to pd.read_csv (e.g. dtype, usecols, chunksize).
+
+    Returns:
+        pd.DataFrame: DataFrame containing the data from the file (or a 
+        reader if chunksize is given).
+    """
+    import pandas as pd
+    if sep is None:
+        sep = sniff_delimiter(file_path)
+    return pd.read_csv(file_path, sep=sep, engine=_csv_engine(engine, kwargs), **kwargs)
+
+
+def _open_df(file_path: str) -> "pd.DataFrame":
     """
     Open a CSV file and return it as a DataFrame.
 
@@ -42,10 +268,87 @@ def _open_df(file_path: str) -> pd.DataFrame:
     if not check_file_exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
-    df = pd.read_csv(file_path, sep=None, engine="python")
+    df = read_table(file_path)
     return df
 
 
+def _is_number(val) -> bool:
+    """
+    Check if a value can be converted to a number.
+
+    Args:
+        val: The value to check.
+
+    Returns:
+        bool: True if the value can be converted to a float.
+    """
+    try:
+        float(val)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def update_column_types(row: dict, numeric: dict, missing: tuple = ()) -> dict:
+    """
+    Check one row against the columns that may still be numeric. Columns
+    are marked as non-numeric (False) on the first value that is not a
+    number and are not checked again.
+
+    Args:
+        row (dict): A row of data (column-value pairs).
+        numeric (dict): Columns mapped to whether they may still be numeric.
+        missing (tuple): Values to skip (e.g. placeholders for missing data).
+
+    Returns:
+        dict: The updated numeric dictionary.
+    """
+    for col in [c for c, is_num in numeric.items() if is_num]:
+        val = row.get(col)
+        if val in missing:
+            continue
+        if not _is_number(val):
+            numeric[col] = False
+    return numeric
+
+
+def infer_column_types(rows, columns: list, sample: int = None,
+                       missing: tuple = ()) -> dict:
+    """
+    Infer the type of each column in a single pass over the rows. Stops as
+    soon as every column has been shown to be non-numeric, or after
+    `sample` rows if given.
+
+    Args:
+        rows (iterable): Rows of data (dictionaries of column-value pairs).
+        columns (list): The columns to check.
+        sample (int): Maximum number of rows to check (all rows if None).
+        missing (tuple): Values to skip (e.g. placeholders for missing data).
+
+    Returns:
+        dict: Columns mapped to "number" if all checked values can be
+        converted to numeric, otherwise "input". Columns with only 
+        missing values are "input".
+    """
+    numeric = {col: True for col in columns}
+    # columns with no value other than a missing value so far
+    empty = set(columns)
+    checked = 0
+    for row in rows:
+        if sample and checked >= sample:
+            break
+        update_column_types(row, numeric, missing)
+        if empty:
+            empty.difference_update([col for col in empty if row.get(col) not in missing])
+        checked += 1
+        if not any(numeric.values()):
+            break
+    return {
+        col: "number" if numeric[col] and col not in empty else "input"
+        for col in columns
+    }
+
+
 def _get_pangenome_acc(_dtype:str)-> dict:
     
     print(f"Getting pangenome colors for {_dtype} type")
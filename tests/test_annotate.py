@@ -47,6 +47,17 @@ def test_construct_annotations_with_valid_path(temp_csv_file, sample_config_file
     assert len(result["metadata_columns"]) == 2
     assert len(result["metadata_tree"]) == 3
 
+def test_construct_annotations_missing_column(tmp_path, sample_config_file):
+    """Test construct_annotations keeps a column with only missing values."""
+    file_path = tmp_path / "missing.csv"
+    file_path.write_text("ID,Missing\nA,\nB,\nC,\n")
+    result = construct_annotations(
+        path=str(file_path),
+        cols=["Missing"],
+        config=sample_config_file
+    )
+    assert len(result["metadata_columns"]) == 1
+
 def test_construct_annotations_with_empty_path():
     """Test construct_annotations with an empty file path."""
     result = construct_annotations(
@@ -0,0 +1,227 @@
+import pytest
+import pandas as pd
+from src.datasmryzr.clusters import (
+    _combine_cluster_ids,
+    _build_cluster_hierarchy,
+    _construct_table_dict,
+    _cluster_statistics,
+    _cluster_summary,
+    _cluster_outliers,
+    _generate_cluster_graphs,
+    get_cluster_distances,
+    get_cluster_graphs,
+    _cluster_box_statistics,
+)
+import json
+
+@pytest.fixture
+def sample_clusters():
+    """Fixture to create a sample cluster table with combined cluster IDs."""
+    df = pd.DataFrame({
+        "ID": ["S1", "S2", "S3", "S4", "S5", "S6"],
+        "Tx:20": ["A", "A", "B", "A", "UC", "B"],
+        "Tx:5": ["a", "b", "UC", "a", "UC", "c"],
+    })
+    return _combine_cluster_ids(df)
+
+def test_build_cluster_hierarchy(sample_clusters):
+    """Test _build_cluster_hierarchy groups isolates by cluster."""
+    nodes = _build_cluster_hierarchy(sample_clusters)
+    assert nodes["all"]["children"] == ["A", "B"]
+    assert nodes["A"]["children"] == ["A:a", "A:b"]
+    assert nodes["B"]["children"] == ["B:c"]
+    assert nodes["A"]["members"] == ["S1", "S2", "S4"]
+    assert nodes["A:a"]["size"] == 2
+    assert "B:UC" not in nodes
+
+def test_construct_table_dict(sample_clusters):
+    """Test _construct_table_dict builds the nested cluster table."""
+    table = _construct_table_dict(_build_cluster_hierarchy(sample_clusters))
+    assert table["_children"] == [
+        {"Cluster ID": "A", "Num seqs": 3, "_children": [
+            {"Cluster ID": "A:a", "Num seqs": 2, "_children": []},
+            {"Cluster ID": "A:b", "Num seqs": 1, "_children": []},
+        ]},
+        {"Cluster ID": "B", "Num seqs": 2, "_children": [
+            {"Cluster ID": "B:c", "Num seqs": 1, "_children": []},
+        ]},
+    ]
+
+def test_combine_cluster_ids():
+    """Test _combine_cluster_ids prefixes cluster IDs with their parent."""
+    df = pd.DataFrame({
+        "ID": ["S1", "S2", "S3"],
+        "Tx:2": ["x", "UC", "UC"],
+        "Tx:20": ["A", "A", "UC"],
+        "Tx:10": ["a", "UC", "UC"],
+    })
+    combined = _combine_cluster_ids(df.copy())
+    assert combined["Tx:10"].tolist() == ["A:a", "A:UC", "UC"]
+    assert combined["Tx:2"].tolist() == ["A:a:x", "A:UC", "UC"]
+    categorical = _combine_cluster_ids(df.copy(), categorical=True)
+    assert isinstance(categorical["Tx:2"].dtype, pd.CategoricalDtype)
+    assert categorical["Tx:2"].astype(str).tolist() == combined["Tx:2"].tolist()
+    assert _build_cluster_hierarchy(categorical) == _build_cluster_hierarchy(combined)
+
+@pytest.fixture
+def sample_distances(tmp_path):
+    """Fixture to create a distances file for the sample clusters."""
+    ids = ["S1", "S2", "S3", "S4", "S5", "S6"]
+    distances_file = tmp_path / "distances.tsv"
+    lines = ["\t".join(["Isolate"] + ids)]
+    for i, name in enumerate(ids):
+        lines.append("\t".join([name] + [str(abs(i - j) * (i + j)) for j in range(6)]))
+    distances_file.write_text("\n".join(lines) + "\n")
+    return str(distances_file)
+
+def test_cluster_statistics(sample_clusters, sample_distances):
+    """Test _cluster_statistics gets intra and inter cluster distances."""
+    cdf = _cluster_statistics(sample_clusters, sample_distances, [20], id_col="ID")
+    intra = cdf[(cdf["Measurement"] == "Intra-cluster distance") & (cdf["Cluster ID"] == "A")]
+    assert intra["pair"].tolist() == ["S1_S2", "S1_S4", "S2_S4"]
+    assert intra["Isolate1"].tolist() == ["S2", "S4", "S4"]
+    assert intra["Distance"].tolist() == [1, 9, 8]
+    inter = cdf[(cdf["Measurement"] == "Inter-cluster distance") & (cdf["Cluster ID"] == "B")]
+    assert sorted(inter["pair"]) == ["S1_S3", "S1_S6", "S2_S3", "S2_S6", "S3_S4", "S4_S6"]
+    assert set(cdf["SNP Threshold"]) == {20}
+
+def test_cluster_statistics_no_clusters(sample_distances):
+    """Test _cluster_statistics with no clustered isolates."""
+    df = pd.DataFrame({"ID": ["S1", "S2"], "Tx:5": ["UC", "UC"]})
+    with pytest.raises(ValueError, match="No distances"):
+        _cluster_statistics(df, sample_distances, [5], id_col="ID")
+
+def test_cluster_summary(sample_clusters, sample_distances):
+    """Test _cluster_summary gets quantiles for each cluster."""
+    cdf = _cluster_statistics(sample_clusters, sample_distances, [20], id_col="ID")
+    summary = _cluster_summary(cdf)
+    row = summary[(summary["Cluster ID"] == "A") & (summary["Measurement"] == "Intra-cluster distance")].iloc[0]
+    assert (row["count"], row["min"], row["median"], row["max"]) == (3, 1, 8, 9)
+
+def test_cluster_outliers():
+    """Test _cluster_outliers counts distances outside 1.5 IQR."""
+    cdf = pd.DataFrame({
+        "Distance": [1, 2, 2, 2, 3, 3, 3, 40, 40],
+        "Cluster ID": "A",
+        "SNP Threshold": 20,
+        "Measurement": "Intra-cluster distance",
+    })
+    outliers = _cluster_outliers(cdf, _cluster_summary(cdf))
+    assert outliers[["Distance", "Pairs"]].values.tolist() == [[40, 2]]
+
+def test_generate_cluster_graphs_summary(sample_clusters, sample_distances):
+    """Test _generate_cluster_graphs draws summary boxplots above max_points."""
+    cdf = _cluster_statistics(sample_clusters, sample_distances, [20, 5], id_col="ID")
+    raw = json.loads(_generate_cluster_graphs(cdf, sample_clusters, "ID", [20, 5]))
+    summary = json.loads(_generate_cluster_graphs(cdf, sample_clusters, "ID", [20, 5], max_points=0))
+    raw_marks = [l["mark"]["type"] for l in raw["vconcat"][0]["hconcat"][2]["layer"]]
+    summary_marks = [l["mark"]["type"] for l in summary["vconcat"][0]["hconcat"][2]["layer"]]
+    assert raw_marks == ["boxplot", "circle"]
+    assert summary_marks == ["rule", "bar", "tick", "circle"]
+
+def test_get_cluster_distances(tmp_path, sample_distances):
+    """Test get_cluster_distances stores the distances of each top level cluster once."""
+    cluster_file = tmp_path / "clusters.tsv"
+    cluster_file.write_text(
+        "ID\tTx:20\tTx:5\n"
+        "S1\tA\ta\nS2\tA\tb\nS3\tB\tUC\nS4\tA\ta\nS5\tUC\tUC\nS6\tB\tc\n"
+    )
+    dists = get_cluster_distances(str(cluster_file), sample_distances)
+    assert dists["id_col"] == "Isolate"
+    assert dists["blocks"]["A"]["ids"] == ["S1", "S2", "S4"]
+    assert dists["blocks"]["B"]["ids"] == ["S3", "S6"]
+    # no distances between clusters A and B are stored
+    assert [len(block["distances"]) for block in dists["blocks"].values()] == [3, 1]
+    assert dists["clusters"]["A:a"] == {"block": "A", "members": [0, 2]}
+    assert dists["clusters"]["B:c"] == {"block": "B", "members": [1]}
+    assert list(dists["clusters"]) == ["A", "A:a", "A:b", "B", "B:c"]
+    # S1 to S4 is (3 - 0) * (3 + 0)
+    assert dists["blocks"]["A"]["distances"][1] == 9
+
+@pytest.fixture
+def sample_cluster_file(tmp_path):
+    """Fixture to create a sample cluster table file."""
+    cluster_file = tmp_path / "clusters.tsv"
+    cluster_file.write_text(
+        "ID\tTx:20\tTx:5\n"
+        "S1\tA\ta\nS2\tA\tb\nS3\tB\tUC\nS4\tA\ta\nS5\tUC\tUC\nS6\tB\tc\n"
+    )
+    return str(cluster_file)
+
+def test_cluster_box_statistics(sample_clusters, sample_distances):
+    """Test _cluster_box_statistics matches the statistics of the pairs."""
+    from src.datasmryzr.clusters import _load_distances
+    dm = _load_distances(sample_distances)
+    summary, outliers, _ = _cluster_box_statistics(sample_clusters, dm, [20, 5], "ID")
+    cdf = _cluster_statistics(sample_clusters, dm, [20, 5], id_col="ID")
+    expected = _cluster_summary(cdf)
+    keys = ["SNP Threshold", "Cluster ID", "Measurement"]
+    merged = summary.merge(expected, on=keys, suffixes=("", "_expected"))
+    assert len(merged) == len(expected) == len(summary)
+    for col in ["count", "min", "q1", "median", "q3", "max"]:
+        assert merged[col].astype(float).tolist() == merged[f"{col}_expected"].astype(float).tolist()
+
+def test_get_cluster_graphs_state(tmp_path, sample_cluster_file, sample_distances, capsys):
+    """Test get_cluster_graphs reuses the statistics saved in the cluster state."""
+    state_file = tmp_path / "state.json"
+    first = get_cluster_graphs(sample_cluster_file, sample_distances, max_points=0, state_file=str(state_file))
+    state = json.loads(state_file.read_text())
+    assert state["matrix"]["ids"] == ["S1", "S2", "S3", "S4", "S5", "S6"]
+    assert set(state["statistics"]["20"]["clusters"]) == {"A", "B"}
+    assert state["statistics"]["20"]["clustered"] == ["S1", "S2", "S3", "S4", "S6"]
+    second = get_cluster_graphs(sample_cluster_file, sample_distances, max_points=0, state_file=str(state_file))
+    assert first == second
+    out = capsys.readouterr().out
+    assert "Distances of 6 of 6 isolates unchanged" in out
+    assert "Reused intra-cluster statistics of 5, reused inter-cluster statistics of 5 and updated inter-cluster statistics of 0 of 5 clusters" in out
+
+def _write_distances(path, n, changed = None):
+    """Write the sample distances of the first n isolates, optionally changing one pair."""
+    ids = [f"S{i + 1}" for i in range(n)]
+    lines = ["\t".join(["Isolate"] + ids)]
+    for i, name in enumerate(ids):
+        row = [abs(i - j) * (i + j) for j in range(n)]
+        if changed is not None and i in changed:
+            row[changed[1 - changed.index(i)]] += 1
+        lines.append("\t".join([name] + [str(d) for d in row]))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+def _box_summary(cluster_file, distances, state_file = None):
+    from src.datasmryzr.clusters import _load_distances, _get_cluster_table, _get_thresholds, _load_cluster_state
+    cluster_df = _combine_cluster_ids(_get_cluster_table(cluster_file))
+    state = _load_cluster_state(state_file) if state_file else {}
+    summary, outliers, _ = _cluster_box_statistics(cluster_df, _load_distances(distances), 
+                                                   _get_thresholds(cluster_df), "ID", state = state, 
+                                                   track = state_file is not None)
+    return summary.sort_values(["SNP Threshold", "Cluster ID", "Measurement"]).reset_index(drop = True)
+
+def test_get_cluster_graphs_state_added_isolates(tmp_path, capsys):
+    """Test only the statistics affected by isolates added to the end of the distances are computed."""
+    state_file = tmp_path / "state.json"
+    cluster_file = tmp_path / "clusters.tsv"
+    cluster_file.write_text("ID\tTx:20\tTx:5\nS1\tA\ta\nS2\tA\tb\nS3\tB\tUC\nS4\tA\ta\nS5\tUC\tUC\n")
+    get_cluster_graphs(str(cluster_file), _write_distances(tmp_path / "d1.tsv", 5), max_points=0, state_file=str(state_file))
+    cluster_file.write_text("ID\tTx:20\tTx:5\nS1\tA\ta\nS2\tA\tb\nS3\tB\tUC\nS4\tA\ta\nS5\tUC\tUC\nS6\tB\tc\nS7\tUC\tUC\n")
+    distances = _write_distances(tmp_path / "d2.tsv", 7)
+    capsys.readouterr()
+    incremental = _box_summary(str(cluster_file), distances, str(state_file))
+    out = capsys.readouterr().out
+    assert "Distances of 5 of 7 isolates unchanged" in out
+    # A, A:a and A:b are unchanged, their inter-cluster statistics gain S6
+    assert "Reused intra-cluster statistics of 3, reused inter-cluster statistics of 0 and updated inter-cluster statistics of 3 of 5 clusters" in out
+    pd.testing.assert_frame_equal(incremental, _box_summary(str(cluster_file), distances))
+
+def test_get_cluster_graphs_state_changed_distance(tmp_path, sample_cluster_file, capsys):
+    """Test statistics are computed again if distances between isolates changed."""
+    state_file = tmp_path / "state.json"
+    get_cluster_graphs(sample_cluster_file, _write_distances(tmp_path / "d1.tsv", 6), max_points=0, state_file=str(state_file))
+    # S2 to S4 changes, so S4 and the isolates after it are changed
+    distances = _write_distances(tmp_path / "d2.tsv", 6, changed = [1, 3])
+    capsys.readouterr()
+    incremental = _box_summary(sample_cluster_file, distances, str(state_file))
+    out = capsys.readouterr().out
+    assert "Distances of 3 of 6 isolates unchanged" in out
+    # only A:b (S2) is unchanged
+    assert "Reused intra-cluster statistics of 1, reused inter-cluster statistics of 0 and updated inter-cluster statistics of 0 of 5 clusters" in out
+    pd.testing.assert_frame_equal(incremental, _box_summary(sample_cluster_file, distances))
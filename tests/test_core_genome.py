@@ -2,15 +2,22 @@ import pytest
 import pandas as pd
 import pathlib
 import gzip
+import json
 import os
 from src.datasmryzr.core_genome import (
-    _get_offset,
+    _contig_offsets,
     get_bin_size,
     check_masked,
     get_contig_breaks,
-    _read_vcf,
-    _get_vcf,
+    _iter_vcf_chunks,
+    _count_variants,
     _plot_snpdensity,
+    _bin_density,
+    _get_mask_intervals,
+    get_masked_totals,
+    _index_reference,
+    _get_ref_accession,
+    _to_genome_positions,
 )
 from src.datasmryzr.utils import check_file_exists
 
@@ -43,14 +50,89 @@ def sample_mask_file(tmp_path):
         f.write("contig1\t50\t150\n")
     return str(mask_file)
 
-def test_get_offset(sample_reference_file):
-    """Test _get_offset function."""
-    contig_info, total_length = _get_offset(sample_reference_file)
+def test_contig_offsets(sample_reference_file):
+    """Test _contig_offsets function."""
+    contig_info, total_length = _contig_offsets(_index_reference(sample_reference_file))
     assert isinstance(contig_info, dict)
     assert total_length == 15000
     assert "contig1" in contig_info
     assert contig_info["contig1"]["length"] == 10000
 
+def test_contig_offsets_gzipped_and_genbank(tmp_path):
+    """Test _contig_offsets with gzipped fasta and genbank references."""
+    fasta_gz = tmp_path / "reference.fasta.gz"
+    with gzip.open(fasta_gz, "wt") as f:
+        f.write(">contig1.1 chromosome\n" + "A" * 60 + "\n" + "A" * 40 + "\n>contig2\n" + "T" * 50 + "\n")
+    genbank = tmp_path / "reference.gbk"
+    genbank.write_text(
+        "LOCUS       contig1                  100 bp    DNA     linear   BCT 01-JAN-2025\n"
+        "VERSION     contig1.1\n"
+        "ORIGIN\n"
+        "        1 aaaaaaaaaa\n"
+        "//\n"
+        "LOCUS       contig2                   50 bp    DNA     linear   BCT 01-JAN-2025\n"
+        "ORIGIN\n"
+        "//\n"
+    )
+    for reference in [fasta_gz, genbank]:
+        contig_info, total_length = _contig_offsets(_index_reference(str(reference)))
+        assert total_length == 150
+        assert contig_info["contig2"] == {"offset": 100, "length": 50}
+        assert _get_ref_accession(str(reference)) == "contig1.1"
+
+def test_index_reference_cache(sample_reference_file, tmp_path):
+    """Test _index_reference saves the contigs and reuses them for the same file."""
+    index_file = tmp_path / "index" / "ref_index.json"
+    index_file.parent.mkdir()
+    contigs = _index_reference(sample_reference_file, index_file = str(index_file))
+    assert contigs[1][:2] == ["contig2", 5000]
+    assert not pathlib.Path(f"{sample_reference_file}.fai").exists()
+    index = json.loads(index_file.read_text())
+    assert index["reference"] == str(pathlib.Path(sample_reference_file).resolve())
+    # name, length, byte offset, bases per line, bytes per line
+    assert index["contigs"][0] == ["contig1", 10000, 9, 10000, 10001]
+    index["contigs"] = [["cached", 42, 0, 0, 0]]
+    index_file.write_text(json.dumps(index))
+    assert _index_reference(sample_reference_file, index_file = str(index_file)) == [["cached", 42, 0, 0, 0]]
+
+def test_index_reference_changed_file(tmp_path):
+    """Test _index_reference rescans a different file with the same name and an older mtime."""
+    index_file = tmp_path / "ref_index.json"
+    reference = tmp_path / "reference.fasta"
+    reference.write_text(">contig1\n" + "A" * 60 + "\n")
+    assert _index_reference(str(reference), index_file = str(index_file)) == [["contig1", 60, 9, 60, 61]]
+    # replaced by a file restored with an older modification time
+    mtime = reference.stat().st_mtime_ns
+    reference.write_text(">contig9\n" + "A" * 80 + "\n")
+    os.utime(reference, ns = (mtime - 10**9, mtime - 10**9))
+    assert _index_reference(str(reference), index_file = str(index_file))[0][:2] == ["contig9", 80]
+    # gzipped and genbank references are saved too, and an index that 
+    # cannot be written is skipped
+    fasta_gz = tmp_path / "reference.fasta.gz"
+    with gzip.open(fasta_gz, "wt") as f:
+        f.write(">contig1\n" + "A" * 60 + "\n")
+    assert _index_reference(str(fasta_gz), index_file = str(index_file)) == [["contig1", 60, 0, 0, 0]]
+    assert json.loads(index_file.read_text())["reference"] == str(fasta_gz.resolve())
+    missing = tmp_path / "missing" / "ref_index.json"
+    assert _index_reference(str(fasta_gz), index_file = str(missing))[0][:2] == ["contig1", 60]
+    assert not missing.exists()
+
+def test_to_genome_positions():
+    """Test _to_genome_positions matches contigs exactly."""
+    contig_info = {
+        "NC_1": {"offset": 0, "length": 1000},
+        "NC_12": {"offset": 1000, "length": 1000},
+    }
+    counts = pd.DataFrame({
+        "#CHROM": ["NC_1.1", "NC_12.1", "NC_12.1", "other"],
+        "POS": [10, 10, 20, 5],
+        "vars": [1, 2, 3, 4],
+    })
+    df = _to_genome_positions(counts, contig_info)
+    assert dict(zip(df["index"], df["vars"])) == {10: 1, 1010: 2, 1020: 3}
+    df = _to_genome_positions(counts, contig_info, strip_version=False)
+    assert df.empty
+
 def test_get_bin_size():
     """Test get_bin_size function."""
     contig_info = {
@@ -70,6 +152,22 @@ def test_check_masked(sample_mask_file, sample_vcf_file):
     assert "mask" in masked_df.columns
     assert masked_df.loc[masked_df["index"] == 100, "mask"].values[0] == "masked"
 
+def test_check_masked_overlapping_intervals(tmp_path):
+    """Test check_masked with overlapping intervals on two contigs."""
+    mask_file = tmp_path / "mask.bed"
+    mask_file.write_text("contig1\t50\t150\ncontig1\t100\t200\ncontig2\t1\t10\n")
+    contig_info = {
+        "contig1": {"offset": 0, "length": 10000},
+        "contig2": {"offset": 10000, "length": 5000},
+    }
+    df = pd.DataFrame({"index": [49, 50, 200, 201, 10005, 10011], "vars": 1})
+    masked_df = check_masked(str(mask_file), df, contig_info)
+    assert list(masked_df["mask"]) == [
+        "unmasked", "masked", "masked", "unmasked", "masked", "unmasked"
+    ]
+    intervals = _get_mask_intervals(str(mask_file), contig_info)
+    assert get_masked_totals(intervals) == {"contig1": 151, "contig2": 10}
+
 def test_get_contig_breaks():
     """Test get_contig_breaks function."""
     contig_info = {
@@ -79,18 +177,42 @@ def test_get_contig_breaks():
     breaks = get_contig_breaks(contig_info)
     assert len(breaks) == 1  # Only contig1 exceeds 5000 bp
 
-def test_read_vcf(sample_vcf_file):
-    """Test _read_vcf function."""
-    lines = _read_vcf(sample_vcf_file)
-    assert len(lines) == 3  # Header + 2 data lines
-    assert lines[1].startswith("contig1")
+def test_count_variants_sample(sample_vcf_file):
+    """Test _count_variants on a VCF file with one sample."""
+    df = _count_variants(sample_vcf_file)
+    assert list(df.columns) == ["#CHROM", "POS", "vars"]
+    assert df["POS"].tolist() == [100, 200]
 
-def test_get_vcf(sample_vcf_file):
-    """Test _get_vcf function."""
-    df = _get_vcf(sample_vcf_file)
-    assert isinstance(df, pd.DataFrame)
-    assert len(df) == 2  # Two rows of data
-    assert "#CHROM" in df.columns
+def test_count_variants_no_records(tmp_path):
+    """Test _count_variants on a CRLF VCF file with a header but no records."""
+    vcf_file = tmp_path / "empty.vcf"
+    vcf_file.write_bytes(
+        b"##fileformat=VCFv4.2\r\n"
+        b"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSample1\r\n"
+    )
+    chunk, samples = next(_iter_vcf_chunks(str(vcf_file)))
+    assert chunk.empty
+    assert samples == ["Sample1"]
+    assert _count_variants(str(vcf_file)).empty
+
+def test_count_variants(tmp_path):
+    """Test _count_variants function on plain and gzipped VCF files."""
+    content = (
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3\n"
+        "contig1\t100\t.\tA\tT\t.\tPASS\t.\tGT\t1\t0\t.\n"
+        "contig1\t200\t.\tA\tG\t.\tPASS\t.\tGT\t0\t0\t0\n"
+        "contig2\t50\t.\tA\tG,C\t.\tPASS\t.\tGT\t2\t1\t1\n"
+    )
+    plain = tmp_path / "sample.vcf"
+    plain.write_text(content)
+    zipped = tmp_path / "sample.vcf.gz"
+    with gzip.open(zipped, "wt") as f:
+        f.write(content)
+    for vcf in [plain, zipped]:
+        df = _count_variants(str(vcf), chunk_size=1)
+        assert list(df["POS"]) == [100, 50]  # all-reference rows are dropped
+        assert list(df["vars"]) == [2, 3]  # missing calls count as non-reference
 
 def test_plot_snpdensity(sample_reference_file, sample_vcf_file, sample_mask_file):
     """Test _plot_snpdensity function."""
@@ -100,4 +222,26 @@ def test_plot_snpdensity(sample_reference_file, sample_vcf_file, sample_mask_fil
         mask_file=sample_mask_file,
     )
     assert isinstance(chart, str)  # Altair chart is returned as JSON
-    assert "Core genome position" in chart
\ No newline at end of file
+    assert "Core genome position" in chart
+
+def test_bin_density():
+    """Test _bin_density function."""
+    df = pd.DataFrame({
+        "index": [10, 20, 120, 130, 260],
+        "vars": [1, 2, 3, 4, 5],
+        "mask": ["unmasked", "unmasked", "masked", "unmasked", "unmasked"],
+    })
+    binned = _bin_density(df, total_length=250, window=100)
+    assert binned["vars"].sum() == df["vars"].sum()
+    assert len(binned) == 4  # one row per window and mask state
+    assert binned["end"].max() == 250  # last window is clipped to the genome
+
+def test_plot_snpdensity_binned(sample_reference_file, sample_vcf_file):
+    """Test _plot_snpdensity with server-side binning."""
+    chart = _plot_snpdensity(
+        reference=sample_reference_file,
+        vcf_file=sample_vcf_file,
+        window=1000,
+    )
+    assert "Variants observed per 1000 bp" in chart
+    assert '"bin"' not in chart
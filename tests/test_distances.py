@@ -1,8 +1,9 @@
 import pytest
 import pandas as pd
+import numpy as np
 import os
 import json
-from src.datasmryzr.distances import _get_distances, _plot_histogram, _plot_heatmap
+from src.datasmryzr.distances import _load_distances, _plot_histogram, _plot_heatmap, _block_reduce, _tree_order, _order_isolates, DistanceMatrix
 from src.datasmryzr.utils import check_file_exists
 
 @pytest.fixture
@@ -18,19 +19,19 @@ def sample_distances_file(tmp_path):
         )
     return str(distances_file)
 
-def test_get_distances(sample_distances_file):
-    """Test _get_distances function."""
-    df = _get_distances(sample_distances_file)
+def test_load_distances(sample_distances_file):
+    """Test _load_distances function."""
+    df = _load_distances(sample_distances_file).melt()
     assert isinstance(df, pd.DataFrame)
     assert len(df) == 6  # 3 isolates, excluding diagonal
     assert "Isolate1" in df.columns
     assert "Isolate2" in df.columns
     assert "Distance" in df.columns
 
-def test_get_distances_file_not_found():
-    """Test _get_distances with a non-existent file."""
+def test_load_distances_file_not_found():
+    """Test _load_distances with a non-existent file."""
     with pytest.raises(FileNotFoundError, match="Distance file non_existent_file.tsv does not exist."):
-        _get_distances("non_existent_file.tsv")
+        _load_distances("non_existent_file.tsv")
 
 def test_plot_histogram(sample_distances_file):
     """Test _plot_histogram function."""
@@ -39,6 +40,13 @@ def test_plot_histogram(sample_distances_file):
     chart_dict = json.loads(chart)
     assert "mark" in chart_dict
     assert chart_dict["mark"] == {'color': '#216cb8', 'type': 'bar'}
+    # only the counts per distance are embedded, each pair counted once
+    data = list(chart_dict["datasets"].values())[0]
+    assert data == [
+        {"Distance": 5, "Frequency": 1},
+        {"Distance": 10, "Frequency": 1},
+        {"Distance": 15, "Frequency": 1},
+    ]
 
 def test_plot_histogram_invalid_file():
     """Test _plot_histogram with an invalid file."""
@@ -53,7 +61,141 @@ def test_plot_heatmap(sample_distances_file):
     assert "mark" in chart_dict
     assert chart_dict["mark"] == {'type': 'rect'}
 
+def test_plot_heatmap_raster(sample_distances_file):
+    """Test _plot_heatmap draws large matrices as an image ordered by the tree."""
+    chart = _plot_heatmap(sample_distances_file, tree="((IsolateC:1,'IsolateA':2):1,IsolateB:3);", max_isolates=2, tile=2)
+    chart_dict = json.loads(chart)
+    marks = [layer["mark"]["type"] for layer in chart_dict["layer"]]
+    assert marks == ["image", "rect"]
+    drilldown = chart_dict["usermeta"]["drilldown"]
+    assert drilldown == {"ids": ["IsolateC", "IsolateA", "IsolateB"], "id_col": "Seqname", "table": "distances"}
+    tiles = [d for d in chart_dict["datasets"].values() if "Maximum" in d[0]][0]
+    assert [(t["row_start"], t["col_end"], t["Minimum"], t["Maximum"]) for t in tiles] == [
+        (0, 2, 0, 10), (0, 3, 5, 15), (2, 2, 5, 15), (2, 3, 0, 0)
+    ]
+
+def test_block_reduce(sample_distances_file):
+    """Test _block_reduce keeps the maximum or minimum of each block."""
+    dm = DistanceMatrix.from_file(sample_distances_file)
+    assert _block_reduce(dm, [0, 1, 2], 2, "max").tolist() == [[5, 15], [15, 0]]
+    assert _block_reduce(dm, [2, 1, 0], 2, "min").tolist() == [[0, 5], [5, 0]]
+    assert _tree_order("(A:1,(B,'C D'):2);") == ["A", "B", "C D"]
+
+def test_order_isolates_without_tree(tmp_path):
+    """Test isolates are ordered by their distances when there is no tree."""
+    distances_file = tmp_path / "distances.csv"
+    names = ["A1", "B1", "A2", "B2", "A3"]
+    rows = ["Isolate," + ",".join(names)]
+    for a in names:
+        rows.append(a + "," + ",".join(
+            "0" if a == b else "1" if a[0] == b[0] else "50" for b in names
+        ))
+    distances_file.write_text("\n".join(rows) + "\n")
+    dm = DistanceMatrix.from_file(str(distances_file))
+    assert [names[i] for i in _order_isolates(dm)] == ["A1", "A2", "A3", "B1", "B2"]
+    assert [names[i] for i in _order_isolates(dm, tree="(B2,A1);")] == ["B2", "A1", "B1", "A2", "A3"]
+    assert isinstance(_plot_heatmap(dm, max_isolates=2), str)
+
 def test_plot_heatmap_invalid_file():
     """Test _plot_heatmap with an invalid file."""
     with pytest.raises(FileNotFoundError, match="Distance file non_existent_file.tsv does not exist."):
-        _plot_heatmap("non_existent_file.tsv")
\ No newline at end of file
+        _plot_heatmap("non_existent_file.tsv")
+
+def test_distance_matrix(sample_distances_file):
+    """Test DistanceMatrix is parsed once and shared by the plots."""
+    dm = DistanceMatrix.from_file(sample_distances_file)
+    assert len(dm) == 3
+    assert dm.id_col == "Seqname"
+    assert dm.pairs([0, 2], [2, 0]).tolist() == [10, 10]
+    assert dm.condensed.dtype == np.int32
+    assert dm.condensed.tolist() == [5, 10, 15]
+    sub = dm.to_frame(ids=["IsolateC", "IsolateA", "Unknown"])
+    assert list(sub.columns) == ["Seqname", "IsolateC", "IsolateA"]
+    assert sub["IsolateA"].tolist() == [10, 0]
+    assert len(dm.melt(ids=["IsolateA", "IsolateB"])) == 2
+    assert _load_distances(dm) is dm
+    assert isinstance(_plot_heatmap(dm), str)
+    sub = dm.subset([2, 1])
+    assert list(sub.ids) == ["IsolateC", "IsolateB"]
+    assert sub.condensed.tolist() == [15]
+    assert dm.subset([0, 1, 2]) is dm
+
+def test_distance_matrix_row_order(tmp_path):
+    """Test DistanceMatrix when rows are not in the same order as columns."""
+    distances_file = tmp_path / "distances.csv"
+    distances_file.write_text(
+        "Isolate,IsolateA,IsolateB,IsolateC\n"
+        "IsolateC,10,15,0\n"
+        "IsolateA,0,5,10\n"
+        "IsolateB,5,0,15\n"
+    )
+    dm = DistanceMatrix.from_file(str(distances_file), chunk_size=1)
+    assert list(dm.ids) == ["IsolateA", "IsolateB", "IsolateC"]
+    assert dm.condensed.tolist() == [5, 10, 15]
+    assert dm.submatrix([2, 0]).tolist() == [[0, 10], [10, 0]]
+
+def test_distance_matrix_chunk_types(tmp_path):
+    """Test the type of the distances is decided from every chunk."""
+    distances_file = tmp_path / "distances.csv"
+    distances_file.write_text(
+        "Isolate,IsolateA,IsolateB,IsolateC\n"
+        "IsolateA,0,5,10\n"
+        "IsolateB,5,0,2.5\n"
+        "IsolateC,10,2.5,0\n"
+    )
+    dm = DistanceMatrix.from_file(str(distances_file), chunk_size=1)
+    assert dm.condensed.dtype == np.float64
+    assert dm.condensed.tolist() == [5, 10, 2.5]
+    distances_file.write_text(
+        "Isolate,IsolateA,IsolateB,IsolateC\n"
+        "IsolateA,0,5,10\n"
+        "IsolateB,5,0,\n"
+        "IsolateC,10,,0\n"
+    )
+    dm = DistanceMatrix.from_file(str(distances_file), chunk_size=1)
+    assert dm.condensed.dtype == np.float64
+    assert np.isnan(dm.condensed[2])
+
+def test_distance_matrix_iter_rows(tmp_path):
+    """Test the rows of the matrix match the text of the distance file."""
+    distances_file = tmp_path / "distances.csv"
+    distances_file.write_text(
+        "Isolate,IsolateA,IsolateB,IsolateC\n"
+        "IsolateA,0,5,10\n"
+        "IsolateB,5,0,\n"
+        "IsolateC,10,,0\n"
+    )
+    rows = list(DistanceMatrix.from_file(str(distances_file)).iter_rows())
+    assert rows[1] == {"Isolate": "IsolateB", "IsolateA": "5", "IsolateB": "0", "IsolateC": ""}
+    distances_file.write_text(
+        "Isolate,IsolateA,IsolateB\n"
+        "IsolateA,0,2.5\n"
+        "IsolateB,2.5,0\n"
+    )
+    rows = list(DistanceMatrix.from_file(str(distances_file)).iter_rows())
+    assert rows[0] == {"Isolate": "IsolateA", "IsolateA": "0", "IsolateB": "2.5"}
+
+def test_plot_histogram_missing_distances(tmp_path):
+    """Test _plot_histogram skips missing distances."""
+    distances_file = tmp_path / "distances.csv"
+    distances_file.write_text(
+        "Isolate,IsolateA,IsolateB,IsolateC\n"
+        "IsolateA,0,5,10\n"
+        "IsolateB,5,0,\n"
+        "IsolateC,10,,0\n"
+    )
+    df = DistanceMatrix.from_file(str(distances_file)).histogram(bins=5)
+    assert df["Frequency"].sum() == 2
+    assert json.loads(_plot_histogram(str(distances_file)))["mark"]["type"] == "bar"
+
+def test_distance_matrix_share(sample_distances_file, tmp_path):
+    """Test a shared distance matrix is pickled without its distances."""
+    import pickle
+    dm = DistanceMatrix.from_file(sample_distances_file)
+    shared = dm.share(str(tmp_path))
+    assert shared.mapped == str(tmp_path / "distances.npy")
+    assert shared.__getstate__()["condensed"] is None
+    copy = pickle.loads(pickle.dumps(shared))
+    assert list(copy.ids) == list(dm.ids)
+    assert copy.condensed.tolist() == dm.condensed.tolist()
+    assert copy.to_frame().equals(dm.to_frame())
@@ -0,0 +1,50 @@
+import pytest
+import json
+from src.datasmryzr.inputs import InputRegistry
+from src.datasmryzr.tables import generate_table
+
+@pytest.fixture
+def sample_config_file(tmp_path):
+    """Fixture to create a sample configuration file."""
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"comments": {}}))
+    return str(config_file)
+
+def test_track():
+    """Test InputRegistry records a file as its rows are read."""
+    registry = InputRegistry()
+    rows = registry.track("data_file.csv", ",", ["Isolate", "ST"], iter([
+        {"Isolate": "S1", "ST": "131"},
+        {"Isolate": "S2", "ST": "73"},
+        {"Isolate": "S1", "ST": "131"},
+        {"Isolate": "", "ST": "12"},
+    ]))
+    next(rows)
+    assert "data_file.csv" not in registry
+    list(rows)
+    assert "data_file.csv" in registry
+    record = registry["data_file.csv"]
+    assert record.n_rows == 4
+    assert record.ids == {"S1", "S2"}
+
+def test_generate_table_registry(sample_config_file, tmp_path):
+    """Test generate_table records the file in the registry."""
+    data_file = tmp_path / "data.tsv"
+    data_file.write_text("Isolate\tST\nS1\t131\nS2\t73\n")
+    json_file = tmp_path / "clusters.json"
+    json_file.write_text(json.dumps([{"Cluster ID": "C1", "_children": []}]))
+    registry = InputRegistry()
+    for _file in [str(data_file), str(json_file)]:
+        generate_table(
+            _file=_file,
+            table_dict={},
+            col_dict={},
+            comment_dict={},
+            cfg_path=sample_config_file,
+            registry=registry
+        )
+    record = registry[str(data_file)]
+    assert (record.delimiter, record.columns, record.n_rows) == ("\t", ["Isolate", "ST"], 2)
+    assert record.ids == {"S1", "S2"}
+    assert registry[str(json_file)].ids == set()
+    assert str(json_file) in registry
@@ -0,0 +1,83 @@
+import pytest
+import os
+from src.datasmryzr.smryz import _get_template, _write_report, _table_sources, _make_tables
+from src.datasmryzr.distances import DistanceMatrix
+
+
+def test_get_template_is_cached():
+    """Test the report template is compiled once per run."""
+    template = _get_template("src/datasmryzr/templates/report.html.j2")
+    assert _get_template("src/datasmryzr/templates/report.html.j2") is template
+    assert template.environment.bytecode_cache is not None
+
+def test_custom_template_extends_report(tmp_path):
+    """Test custom templates can reuse the report and its partials."""
+    custom = tmp_path / "report.html.j2"
+    custom.write_text(
+        '{% extends "datasmryzr/report.html.j2" %}'
+        '{% block header %}<header>{{ title }}</header>{% endblock %}'
+    )
+    (tmp_path / "partials").mkdir()
+    (tmp_path / "partials" / "graphs.html.j2").write_text("// no graphs\n")
+    html = _get_template(str(custom)).render({
+        "title": "A report",
+        "menu": [{"link": "summary", "name": "summary"}],
+        "table_sources": {},
+        "tables": {},
+        "columns": {},
+        "distdict": {},
+        "metadata_tree": {},
+        "metadata_columns": [],
+        "colors_css": {},
+        "legend": {},
+        "comment": {},
+    })
+    assert "<header>A report</header>" in html
+    assert "// no graphs" in html and "snp_distance_chart" not in html
+    assert '<style type="text/css">' in html and "var table_dict = {};" in html
+
+def test_table_sources(tmp_path):
+    """Test spooled rows are only left in the spool for the report template."""
+    spool = tmp_path / "summary-0.json"
+    spool.write_text('[{"Isolate": "\\u003cS1\\u003e"}]')
+    tables = lambda: {"summary": {"link": "summary", "tables": [], "sources": [str(spool)]}}
+    table_dict = tables()
+    assert _table_sources(table_dict, "src/datasmryzr/templates/report.html.j2") == {"summary": [str(spool)]}
+    assert table_dict["summary"]["tables"] == []
+    # custom templates may read the rows from tables
+    table_dict = tables()
+    assert _table_sources(table_dict, str(tmp_path / "custom.html.j2")) == {}
+    assert table_dict["summary"] == {"link": "summary", "tables": [{"Isolate": "<S1>"}]}
+
+def test_get_template_not_found():
+    """Test _get_template with a missing template."""
+    with pytest.raises(FileNotFoundError):
+        _get_template("non_existent_template.html.j2")
+
+def test_write_report(tmp_path):
+    """Test the report is only written once it is complete."""
+    template = tmp_path / "template.html.j2"
+    template.write_text("<p>{{ title }}</p>{% for chunk in data | json_chunks %}{{ chunk }}{% endfor %}{{ fail() }}")
+    target = tmp_path / "report.html"
+    with pytest.raises(ZeroDivisionError):
+        _write_report(_get_template(str(template)), {"title": "t", "data": {"a": 1}, "fail": lambda: 1 / 0}, target)
+    assert os.listdir(tmp_path) == ["template.html.j2"]
+    _write_report(_get_template(str(template)), {"title": "t", "data": {"a": "<b>"}, "fail": lambda: ""}, target)
+    assert target.read_text() == '<p>t</p>{"a": "\\u003cb\\u003e"}'
+
+def test_make_tables_distances(tmp_path, capsys):
+    """Test the distances table is made from the parsed matrix."""
+    distances_file = tmp_path / "distances.tsv"
+    distances_file.write_text("Isolate\tS1\tS2\nS1\t0\t3\nS2\t3\t0\n")
+    config_file = tmp_path / "config.json"
+    config_file.write_text("{}")
+    dm = DistanceMatrix.from_file(str(distances_file))
+    capsys.readouterr()
+    table_dict, col_dict, _, registry = _make_tables([str(distances_file)], str(config_file), distances=dm)
+    assert "Reading tabular data" not in capsys.readouterr().out
+    assert table_dict["distances"]["tables"] == [
+        {"id": 1, "Isolate": "S1", "S1": "0", "S2": "3"},
+        {"id": 2, "Isolate": "S2", "S1": "3", "S2": "0"},
+    ]
+    assert [col["field"] for col in col_dict["distances"]] == ["Isolate", "S1", "S2"]
+    assert registry[str(distances_file)].ids == {"S1", "S2"}
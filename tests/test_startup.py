@@ -0,0 +1,46 @@
+import pytest
+import os
+import sys
+import json
+import pathlib
+import subprocess
+
+SRC = pathlib.Path(__file__).parent.parent / "src"
+HEAVY_MODULES = ["pandas", "numpy", "altair", "Bio", "mycolorpy", "matplotlib", "jinja2"]
+
+
+def _import_cli() -> dict:
+    """Import the command line interface in a new interpreter."""
+    code = (
+        "import sys, json\n"
+        "import datasmryzr.datasmryzr\n"
+        f"print(json.dumps({{'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def test_cli_does_not_import_heavy_modules():
+    """Test the command line interface does not import the section libraries."""
+    assert _import_cli()["loaded"] == []
+
+
+def test_tables_only_report_does_not_import_heavy_modules(tmp_path):
+    """Test a report of tables only does not import the graph libraries."""
+    data_file = tmp_path / "summary.csv"
+    data_file.write_text("Isolate,ST\nS1,131\nS2,73\n")
+    code = (
+        "import sys, json\n"
+        "from datasmryzr.datasmryzr import smryzr\n"
+        f"smryzr.main(['-o', {str(tmp_path)!r}, '-t', 'report', '-f', {str(data_file)!r}], standalone_mode=False)\n"
+        "print(json.dumps([m for m in ('altair', 'pandas') if m in sys.modules]))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True, cwd=tmp_path
+    )
+    assert (tmp_path / "report.html").exists()
+    assert json.loads(result.stdout.splitlines()[-1]) == []
@@ -2,10 +2,13 @@ import pytest
 import os
 import json
 import csv
+import gc
 from src.datasmryzr.tables import (
     _get_delimiter,
-    _check_numeric,
+    _iter_tabular_data,
     generate_table,
+    read_spool,
+    iter_json,
 )
 from src.datasmryzr.utils import check_file_exists
 
@@ -51,15 +54,16 @@ def test_get_delimiter_unknown_format(tmp_path):
     with pytest.raises(ValueError, match="Unknown delimiter"):
         _get_delimiter(str(unknown_file))
 
-def test_check_numeric():
-    """Test _check_numeric function."""
-    data = [{"Column1": "1"}, {"Column1": "2.5"}, {"Column1": "3"}]
-    result = _check_numeric("Column1", data)
-    assert result == "number"
-
-    data = [{"Column1": "A"}, {"Column1": "B"}, {"Column1": "C"}]
-    result = _check_numeric("Column1", data)
-    assert result == "input"
+def test_iter_tabular_data(sample_data_file, recwarn):
+    """Test _iter_tabular_data reads the header and closes the file."""
+    rows, columns = _iter_tabular_data(sample_data_file, ",")
+    assert columns == ["Column1", "Column2"]
+    # rows that are never read do not leave the file open
+    del rows
+    gc.collect()
+    rows, _ = _iter_tabular_data(sample_data_file, ",")
+    assert [row["Column1"] for row in rows] == ["1", "2", "3"]
+    assert not [w for w in recwarn if issubclass(w.category, ResourceWarning)]
 
 def test_generate_table(sample_data_file, sample_config_file):
     """Test generate_table function."""
@@ -85,4 +89,75 @@ def test_generate_table(sample_data_file, sample_config_file):
 
     # Check comment_dict structure
     assert "data" in comment_dict
-    assert comment_dict["data"] == "This is a sample table comment."
\ No newline at end of file
+    assert comment_dict["data"] == "This is a sample table comment."
+
+def test_generate_table_spool(sample_data_file, sample_config_file, tmp_path):
+    """Test generate_table writes the rows to a JSON file in the spool directory."""
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    table_dict, col_dict, _ = generate_table(
+        _file=sample_data_file,
+        table_dict={},
+        col_dict={},
+        comment_dict={},
+        cfg_path=sample_config_file,
+        spool_dir=str(spool_dir)
+    )
+    assert table_dict["data"]["tables"] == []
+    assert table_dict["data"]["has_graph"] == "false"
+    sources = table_dict["data"]["sources"]
+    assert len(sources) == 1
+    rows = json.loads("".join(read_spool(sources[0], chunk_size=8)))
+    assert rows[0] == {"id": 1, "Column1": "1", "Column2": "A"}
+    assert len(rows) == 3
+    assert col_dict["data"][0]["headerFilter"] == "number"
+
+def test_generate_table_spool_escapes_html(sample_config_file, tmp_path):
+    """Test spooled rows are safe to embed in a html script."""
+    data_file = tmp_path / "data.csv"
+    data_file.write_text("Isolate,Note\nS1,</script>&'\n")
+    table_dict, _, _ = generate_table(
+        _file=str(data_file),
+        table_dict={},
+        col_dict={},
+        comment_dict={},
+        cfg_path=sample_config_file,
+        spool_dir=str(tmp_path)
+    )
+    text = "".join(read_spool(table_dict["data"]["sources"][0]))
+    assert "</script>" not in text and "&" not in text and "'" not in text
+    assert json.loads(text)[0]["Note"] == "</script>&'"
+
+def test_generate_table_nested_json(sample_config_file, tmp_path, capsys):
+    """Test nested JSON tables find columns at every depth without printing rows."""
+    json_file = tmp_path / "clusters.json"
+    json_file.write_text(json.dumps([
+        {"Cluster ID": "C1", "Num seqs": 3, "_children": [
+            {"Cluster ID": "C1:S0", "Num seqs": 3, "_children": [
+                {"Cluster ID": "C1:S0:T0", "Num seqs": 2, "Note": "deep", "_children": []}
+            ]}
+        ]}
+    ]))
+    table_dict, col_dict, _ = generate_table(
+        _file=str(json_file),
+        table_dict={},
+        col_dict={},
+        comment_dict={},
+        cfg_path=sample_config_file
+    )
+    assert [c["field"] for c in col_dict["clusters"]] == ["Cluster ID", "Num seqs", "Note"]
+    assert [c["headerFilter"] for c in col_dict["clusters"]] == ["input", "number", "input"]
+    row = table_dict["clusters"]["tables"][0]
+    child = row["_children"][0]
+    assert child["id"] == 2
+    assert child["_children"] == [{"id": 3, "Cluster ID": "C1:S0:T0", "Num seqs": "2", "Note": "deep"}]
+    assert "deep" not in capsys.readouterr().out
+
+def test_iter_json():
+    """Test iter_json writes large objects in chunks, as the tojson filter."""
+    import jinja2
+    obj = {"b": list(range(25)), "a": {"<tag>": "it's & more"}, "c": []}
+    chunks = list(iter_json(obj, chunk_items=10))
+    assert "".join(chunks) == jinja2.Template("{{ obj | tojson }}").render(obj=obj)
+    assert max(len(chunk) for chunk in chunks) < len("".join(chunks)) / 2
+    assert "".join(iter_json({1: [1.5, None]})) == '{"1": [1.5, null]}'
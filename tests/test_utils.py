@@ -1,6 +1,15 @@
 import pytest
 import os
-from src.datasmryzr.utils import check_file_exists
+import json
+from src.datasmryzr.utils import (
+    check_file_exists,
+    sniff_delimiter,
+    read_table,
+    _csv_engine,
+    infer_column_types,
+    Config,
+    load_config,
+)
 
 @pytest.fixture
 def temp_file():
@@ -18,4 +27,85 @@ def test_check_file_exists_file_exists(temp_file):
 
 def test_check_file_exists_file_does_not_exist():
     """Test check_file_exists when the file does not exist."""
-    assert check_file_exists("non_existent_file.txt") is False
\ No newline at end of file
+    assert check_file_exists("non_existent_file.txt") is False
+
+def test_sniff_delimiter(tmp_path):
+    """Test sniff_delimiter only reads the start of the file."""
+    tab_file = tmp_path / "data.tsv"
+    tab_file.write_text("Isolate\tgenes\n" + "S1\tblaTEM,aph;sul1\n" * 2000)
+    assert sniff_delimiter(str(tab_file)) == "\t"
+    semi_file = tmp_path / "data.txt"
+    semi_file.write_text("Isolate;ST\nS1;131\nS2;73\n")
+    assert sniff_delimiter(str(semi_file)) == ";"
+    single_file = tmp_path / "single.txt"
+    single_file.write_text("Isolate\nS1\nS2\n")
+    assert sniff_delimiter(str(single_file)) == "\t"
+    unknown_file = tmp_path / "unknown.txt"
+    unknown_file.write_text("Column1 Column2\n1 A\n")
+    with pytest.raises(ValueError, match="Unknown delimiter"):
+        sniff_delimiter(str(unknown_file))
+
+def test_read_table(tmp_path):
+    """Test read_table detects the delimiter and passes options to pandas."""
+    csv_file = tmp_path / "data.csv"
+    csv_file.write_text("Isolate,ST\nS1,0131\nS2,73\n")
+    df = read_table(str(csv_file), dtype=str)
+    assert list(df.columns) == ["Isolate", "ST"]
+    assert df["ST"].tolist() == ["0131", "73"]
+    chunks = list(read_table(str(csv_file), chunksize=1, engine="pyarrow"))
+    assert len(chunks) == 2
+    # types are inferred by the C parser unless pyarrow is asked for
+    assert _csv_engine("c", {}) == "c"
+    assert _csv_engine("pyarrow", {"chunksize": 1}) == "c"
+    single_file = tmp_path / "single.txt"
+    single_file.write_text("Isolate\nS1\nS2\n")
+    assert read_table(str(single_file))["Isolate"].tolist() == ["S1", "S2"]
+
+def test_infer_column_types():
+    """Test infer_column_types checks columns in one pass and stops early."""
+    rows = [{"ST": "131", "MLST": "A"}, {"ST": "2.5", "MLST": "3"}]
+    assert infer_column_types(rows, ["ST", "MLST"]) == {"ST": "number", "MLST": "input"}
+    assert infer_column_types([], ["ST"]) == {"ST": "input"}
+    assert infer_column_types([{"ST": "NA"}, {"ST": 73}], ["ST"], missing=("NA",)) == {"ST": "number"}
+    # a column of missing values only is not numeric
+    assert infer_column_types([{"ST": "NA"}, {"ST": "NA"}], ["ST"], missing=("NA",)) == {"ST": "input"}
+
+    def _rows():
+        yield {"MLST": "A"}
+        raise AssertionError("rows read after every column was non-numeric")
+    assert infer_column_types(_rows(), ["MLST"]) == {"MLST": "input"}
+    # only the sampled rows are checked
+    rows = [{"ST": "131"}, {"ST": "unknown"}]
+    assert infer_column_types(rows, ["ST"], sample=1) == {"ST": "number"}
+
+def test_load_config(tmp_path):
+    """Test load_config reads and validates the configuration once."""
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({
+        "datatype": {"ST": "input"},
+        "categorical_columns": ["ST", "MLST"],
+        "has_graph": ["summary"],
+        "id_column": "Isolate",
+        "type_sample_rows": 100
+    }))
+    cfg = load_config(str(config_file))
+    assert cfg.categorical_columns == {"ST", "MLST"}
+    assert "summary" in cfg.has_graph
+    assert cfg.datatype["ST"] == "input"
+    assert cfg.comments == {} and cfg.menu == ()
+    assert cfg.type_sample_rows == 100
+    assert load_config(cfg) is cfg
+
+def test_load_config_invalid(tmp_path):
+    """Test load_config fails on missing or invalid configuration files."""
+    with pytest.raises(FileNotFoundError):
+        load_config(str(tmp_path / "missing.json"))
+    config_file = tmp_path / "config.json"
+    config_file.write_text('{"categorical_columns": "ST"}')
+    with pytest.raises(ValueError, match="categorical_columns"):
+        load_config(str(config_file))
+    config_file.write_text('{"comments": {')
+    with pytest.raises(ValueError, match="Invalid configuration"):
+        load_config(str(config_file))
+    with pytest.raises(ValueError, match="type_sample_rows"):
+        Config.from_dict({"type_sample_rows": 0})